@@ -1,37 +1,194 @@
-from flask import Flask, render_template_string, request, jsonify, send_file
+from flask import Flask, render_template_string, request, jsonify, g, Response, stream_with_context
+import json
 import tensorflow as tf
 import numpy as np
-from tensorflow.keras.preprocessing import image
 import base64
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageFile
 import os
+import shutil
+import importlib.util
 import tempfile
 import logging
 import time
 import threading
-from datetime import datetime
+import queue
+import atexit
+import hashlib
+import zipfile
+import uuid
+import re
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import wraps
+from contextlib import contextmanager
+from types import SimpleNamespace
 
 try:
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.chrome.service import Service
-    from webdriver_manager.chrome import ChromeDriverManager
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    SELENIUM_AVAILABLE = True
-    print("Selenium available - Real 3D screenshots enabled")
+    import fcntl
 except ImportError:
-    SELENIUM_AVAILABLE = False
+    # No file locks on Windows, where the app runs as a single process anyway
+    fcntl = None
+
+SELENIUM_AVAILABLE = (importlib.util.find_spec("selenium") is not None
+                      and importlib.util.find_spec("webdriver_manager") is not None)
+if SELENIUM_AVAILABLE:
+    print("Selenium available - Real 3D screenshots enabled")
+else:
     print("Selenium not available - Using fallback screenshot method")
     print("Install: pip install selenium webdriver-manager")
 
+selenium_modules = None
+
+def import_selenium():
+    """Import Selenium and webdriver_manager on first use instead of at startup"""
+    global selenium_modules
+    if selenium_modules is None:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+        from selenium.webdriver.support.ui import WebDriverWait
+        selenium_modules = SimpleNamespace(webdriver=webdriver, Options=Options, Service=Service,
+                                           ChromeDriverManager=ChromeDriverManager, WebDriverWait=WebDriverWait)
+    return selenium_modules
+
+try:
+    from ai_edge_litert.interpreter import Interpreter as TFLiteInterpreter
+except ImportError:
+    TFLiteInterpreter = tf.lite.Interpreter
+
 app = Flask(__name__)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+class Counter:
+    """Prometheus counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            return [f"{self.name}{format_labels(key)} {value}" for key, value in sorted(self.values.items())]
+
+class Gauge(Counter):
+    """Prometheus gauge with optional labels"""
+
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+
+class Histogram:
+    """Prometheus histogram with cumulative buckets and optional labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{format_labels(key + (('le', repr(float(bound))),))} {count}")
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{format_labels(key)} {series['count']}")
+        return lines
+
+STAGE_LATENCY = Histogram("car_stage_duration_seconds", "Latency of hot-path stages (decode, resize, encode, disk write)")
+MODEL_LATENCY = Histogram("car_model_inference_seconds", "Inference latency per part model, or for the fused graph")
+BATCH_SIZE = Histogram("car_inference_batch_size", "Frames per batched inference call", buckets=(1, 2, 4, 8, 16, 32, 64))
+BATCH_WAIT = Histogram("car_batch_queue_wait_seconds", "Time a frame waited in the micro-batching queue")
+REQUEST_LATENCY = Histogram("car_http_request_duration_seconds", "HTTP request latency per endpoint")
+REQUEST_COUNT = Counter("car_http_requests_total", "HTTP requests per endpoint and status code")
+REQUEST_ERRORS = Counter("car_http_request_errors_total", "HTTP requests answered with a 4xx or 5xx status")
+REQUESTS_IN_FLIGHT = Gauge("car_http_requests_in_flight", "HTTP requests currently being handled")
+METRICS = [STAGE_LATENCY, MODEL_LATENCY, BATCH_SIZE, BATCH_WAIT, REQUEST_LATENCY, REQUEST_COUNT, REQUEST_ERRORS, REQUESTS_IN_FLIGHT]
+
+def render_metrics(extra=()):
+    """Render the registered metrics (plus (name, kind, help, lines) extras) in Prometheus text format"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for name, kind, help_text, values in extra:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(values)
+    return "\n".join(lines) + "\n"
+
+@app.before_request
+def track_request_start():
+    g.request_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def track_request_end(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUEST_LATENCY.observe(time.perf_counter() - g.get("request_start", time.perf_counter()), endpoint=endpoint)
+    REQUEST_COUNT.inc(endpoint=endpoint, status=response.status_code)
+    if response.status_code >= 400:
+        REQUEST_ERRORS.inc(endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def track_request_teardown(exc):
+    if "request_start" in g:
+        REQUESTS_IN_FLIGHT.dec()
+
 UPLOAD_DIR = os.path.join(os.getcwd(), "screenshots")
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
@@ -49,20 +206,142 @@ models_info = {
 models = {}
 class_names = ["closed", "open"]
 
-def load_models():
-    """Load all models with error handling"""
-    global models
-    for name, path in models_info.items():
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "keras")
+TFLITE_BACKENDS = {"tflite_float16": "float16", "tflite_int8": "int8"}
+TFLITE_DIR = os.environ.get("TFLITE_DIR", "tflite_models")
+TFLITE_NUM_THREADS = int(os.environ.get("TFLITE_NUM_THREADS", "0")) or None
+
+USE_FUSED_MODEL = os.environ.get("USE_FUSED_MODEL", "1") == "1"
+fused_model = None
+inference_fns = {}
+IMG_SIZE = (256, 256)
+INPUT_SIGNATURE = [tf.TensorSpec(shape=[None, 256, 256, 3], dtype=tf.uint8)]
+
+USE_BATCHING = os.environ.get("PREDICT_BATCHING", "1") == "1"
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", "8"))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", "10"))
+
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "256"))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "60"))
+
+FRAME_DIFF_THRESHOLD = float(os.environ.get("FRAME_DIFF_THRESHOLD", "0.03"))
+FRAME_GATE_MAX_AGE = float(os.environ.get("FRAME_GATE_MAX_AGE", "120"))
+FRAME_GATE_MAX_CLIENTS = int(os.environ.get("FRAME_GATE_MAX_CLIENTS", "1024"))
+
+STREAM_CONF_DELTA = float(os.environ.get("STREAM_CONF_DELTA", "0.05"))
+STREAM_KEEPALIVE_SECONDS = float(os.environ.get("STREAM_KEEPALIVE_SECONDS", "15"))
+STREAM_MAX_CLIENTS = int(os.environ.get("STREAM_MAX_CLIENTS", "1024"))
+
+MODEL_LOAD_WORKERS = int(os.environ.get("MODEL_LOAD_WORKERS", "5"))
+LOAD_MODELS_IN_BACKGROUND = os.environ.get("LOAD_MODELS_IN_BACKGROUND", "1") == "1"
+models_ready = threading.Event()
+model_status = {name: {"state": "pending", "source": None, "load_ms": None, "error": None} for name in models_info}
+startup_info = {"started_at": time.time(), "ready_at": None, "load_ms": None, "warmup_ms": None, "error": None}
+
+def load_model_for_part(name, path, variant):
+    """Load one part model, preferring the exported TFLite variant when configured"""
+    status = model_status[name]
+    status.update(state="loading", error=None)
+    start = time.perf_counter()
+    model = None
+    if variant is not None:
+        tflite_path = tflite_model_path(name, variant)
+        try:
+            if os.path.exists(tflite_path):
+                model = TFLiteModel(tflite_path, TFLITE_NUM_THREADS)
+                status["source"] = f"tflite_{variant}"
+                logger.info(f"Model {name} loaded from {tflite_path}")
+            else:
+                logger.warning(f"TFLite model {tflite_path} not found, falling back to keras")
+        except Exception as e:
+            logger.error(f"Error loading TFLite model {name}: {str(e)}")
+    if model is None:
         try:
             if os.path.exists(path):
-                models[name] = tf.keras.models.load_model(path)
+                model = tf.keras.models.load_model(path)
+                status["source"] = "keras"
                 logger.info(f"Model {name} loaded successfully")
             else:
                 logger.warning(f"Model file {path} not found, using dummy model")
-                models[name] = create_dummy_model()
+                model = create_dummy_model()
+                status["source"] = "dummy"
         except Exception as e:
             logger.error(f"Error loading model {name}: {str(e)}")
-            models[name] = create_dummy_model()
+            model = create_dummy_model()
+            status.update(source="dummy", error=str(e))
+    status.update(state="loaded", load_ms=round((time.perf_counter() - start) * 1000, 1))
+    return model
+
+def load_models():
+    """Load all models concurrently, then compile and warm them up"""
+    global models
+    start = time.perf_counter()
+    variant = TFLITE_BACKENDS.get(MODEL_BACKEND)
+    if MODEL_BACKEND != "keras" and variant is None:
+        logger.warning(f"Unknown MODEL_BACKEND {MODEL_BACKEND}, using keras")
+    with ThreadPoolExecutor(max_workers=max(1, MODEL_LOAD_WORKERS), thread_name_prefix="model-loader") as pool:
+        futures = {name: pool.submit(load_model_for_part, name, path, variant)
+                   for name, path in models_info.items()}
+        models = {name: future.result() for name, future in futures.items()}
+    startup_info["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    build_inference_fns()
+    if USE_FUSED_MODEL and not any(isinstance(model, TFLiteModel) for model in models.values()):
+        build_fused_model()
+    startup_info["warmup_ms"] = warmup_models()
+    for status in model_status.values():
+        status["state"] = "ready"
+    startup_info["ready_at"] = time.time()
+    models_ready.set()
+    logger.info(f"Models ready {startup_info['ready_at'] - startup_info['started_at']:.1f}s after startup")
+
+def start_model_loading():
+    """Load the models on a background thread so the server can start immediately"""
+    def run():
+        try:
+            load_models()
+        except Exception as e:
+            startup_info["error"] = str(e)
+            logger.error(f"Model loading failed: {str(e)}")
+    thread = threading.Thread(target=run, name="model-loading", daemon=True)
+    thread.start()
+    return thread
+
+def require_models_ready(view):
+    """Answer 503 instead of predicting while the models are still loading"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not models_ready.is_set():
+            return jsonify({"error": "Models are still loading", "models": model_status}), 503
+        return view(*args, **kwargs)
+    return wrapper
+
+def tflite_model_path(part, variant):
+    """Location of the exported TFLite model for a part, e.g. tflite_models/hood_5000_int8.tflite"""
+    stem = os.path.splitext(os.path.basename(models_info[part]))[0]
+    return os.path.join(TFLITE_DIR, f"{stem}_{variant}.tflite")
+
+class TFLiteModel:
+    """Runs an exported .tflite part classifier on uint8 image batches"""
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.interpreter = TFLiteInterpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.batch_size = 1
+        self.lock = threading.Lock()
+
+    def __call__(self, img_batch):
+        img_float = np.asarray(img_batch, dtype=np.float32) / 255.0
+        with self.lock:
+            if img_float.shape[0] != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input_index, img_float.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = img_float.shape[0]
+            self.interpreter.set_tensor(self.input_index, img_float)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
 
 def create_dummy_model():
     """Create a simple dummy model for testing"""
@@ -73,65 +352,1153 @@ def create_dummy_model():
     ])
     return model
 
-def predict_all_models(pil_img):
-    """Predict using all loaded models"""
+def normalize_batch(img_batch):
+    """Scale a uint8 image batch to [0, 1] inside the graph"""
+    return tf.cast(img_batch, tf.float32) / 255.0
+
+def build_inference_fns():
+    """Build one fixed-signature compiled function per part model"""
+    global inference_fns
+    inference_fns = {}
+    for part, model in models.items():
+        if isinstance(model, TFLiteModel):
+            inference_fns[part] = model
+        else:
+            inference_fns[part] = tf.function(
+                lambda img_batch, m=model: m(normalize_batch(img_batch), training=False),
+                input_signature=INPUT_SIGNATURE)
+
+def build_fused_model():
+    """Combine all part classifiers into one multi-output graph"""
+    global fused_model
+    parts = dict(models)
+
+    @tf.function(input_signature=INPUT_SIGNATURE)
+    def fused(img_batch):
+        normalized = normalize_batch(img_batch)
+        return {part: model(normalized, training=False) for part, model in parts.items()}
+
+    fused_model = fused
+    logger.info(f"Fused inference graph built with {len(parts)} heads")
+
+def warmup_models():
+    """Trace the compiled functions on a dummy frame before serving traffic"""
+    dummy = np.zeros((1, 256, 256, 3), dtype=np.uint8)
+    start = time.perf_counter()
     try:
-        img = pil_img.resize((256, 256))
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0) / 255.0
-        
-        results = {}
-        for part, model in models.items():
+        for fn in inference_fns.values():
+            fn(dummy)
+        if fused_model is not None:
+            fused_model(dummy)
+        warmup_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Models warmed up in {warmup_ms:.0f} ms")
+        return round(warmup_ms, 1)
+    except Exception as e:
+        logger.error(f"Model warmup failed: {str(e)}")
+        return None
+
+def preprocess_image(pil_img):
+    """Resize a PIL image into a single-image uint8 batch; scaling happens in the graph"""
+    if pil_img.mode != "RGB":
+        pil_img = pil_img.convert("RGB")
+    with STAGE_LATENCY.time(stage="resize"):
+        img = pil_img.resize(IMG_SIZE)
+    return np.asarray(img, dtype=np.uint8)[np.newaxis]
+
+def format_prediction(prediction):
+    """Turn a sigmoid score into a status/confidence pair"""
+    predicted_class = class_names[int(prediction > 0.5)]
+    confidence = prediction if prediction > 0.5 else 1 - prediction
+    return {"status": predicted_class, "conf": float(confidence)}
+
+def predict_with_loop(img_batch):
+    """Run every model separately through its compiled function"""
+    img_tensor = None
+    results = [{} for _ in range(len(img_batch))]
+    for part, fn in inference_fns.items():
+        try:
+            if isinstance(fn, TFLiteModel):
+                # TFLite parts stay NumPy-only so pre-forked workers never touch the TF runtime
+                with MODEL_LATENCY.time(model=part):
+                    predictions = fn(img_batch)[:, 0]
+            else:
+                if img_tensor is None:
+                    img_tensor = tf.convert_to_tensor(img_batch, dtype=tf.uint8)
+                with MODEL_LATENCY.time(model=part):
+                    predictions = fn(img_tensor).numpy()[:, 0]
+            for result, prediction in zip(results, predictions):
+                result[part] = format_prediction(float(prediction))
+        except Exception as e:
+            logger.error(f"Error predicting for {part}: {str(e)}")
+            for result in results:
+                result[part] = {"status": "unknown", "conf": 0.0}
+    return results
+
+def predict_with_fused(img_batch):
+    """Run all part heads in a single forward pass of the fused graph"""
+    with MODEL_LATENCY.time(model="fused"):
+        outputs = fused_model(tf.convert_to_tensor(img_batch, dtype=tf.uint8))
+        predictions = {part: outputs[part].numpy()[:, 0] for part in models.keys()}
+    return [{part: format_prediction(float(predictions[part][i])) for part in models.keys()}
+            for i in range(len(img_batch))]
+
+def predict_batch(img_batch):
+    """Predict every part for a stacked batch of preprocessed images"""
+    if fused_model is not None:
+        try:
+            return predict_with_fused(img_batch)
+        except Exception as e:
+            logger.error(f"Fused inference failed, falling back to per-model loop: {str(e)}")
+    return predict_with_loop(img_batch)
+
+class MicroBatcher:
+    """Groups frames from concurrent requests into one batched inference call"""
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {
+            "batches": 0,
+            "frames": 0,
+            "last_batch_size": 0,
+            "max_batch_size_seen": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms_seen": 0.0,
+            "batch_size_counts": {},
+        }
+        self.thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, img_array):
+        """Queue a preprocessed (1, 256, 256, 3) frame and return a Future for its result"""
+        future = Future()
+        self.queue.put((img_array, future, time.perf_counter()))
+        return future
+
+    def predict(self, img_array, timeout=30):
+        return self.submit(img_array).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        # A lone frame goes straight to the model; waiting for company only pays
+        # off when other requests are already queued behind it
+        if self.queue.empty():
+            return batch
+        deadline = batch[0][2] + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
             try:
-                prediction = model.predict(img_array, verbose=0)[0][0]
-                predicted_class = class_names[int(prediction > 0.5)]
-                confidence = prediction if prediction > 0.5 else 1 - prediction
-                results[part] = {"status": predicted_class, "conf": float(confidence)}
+                img_batch = np.concatenate([item[0] for item in batch], axis=0)
+                results = self.predict_fn(img_batch)
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
             except Exception as e:
-                logger.error(f"Error predicting for {part}: {str(e)}")
-                results[part] = {"status": "unknown", "conf": 0.0}
+                logger.error(f"Batched inference failed: {str(e)}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            self._record(batch, started)
+
+    def _record(self, batch, started):
+        size = len(batch)
+        waits = [(started - enqueued) * 1000 for _, _, enqueued in batch]
+        with self.lock:
+            self.stats["batches"] += 1
+            self.stats["frames"] += size
+            self.stats["last_batch_size"] = size
+            self.stats["max_batch_size_seen"] = max(self.stats["max_batch_size_seen"], size)
+            self.stats["total_wait_ms"] += sum(waits)
+            self.stats["max_wait_ms_seen"] = max(self.stats["max_wait_ms_seen"], max(waits))
+            counts = self.stats["batch_size_counts"]
+            counts[size] = counts.get(size, 0) + 1
+        BATCH_SIZE.observe(size)
+        for wait in waits:
+            BATCH_WAIT.observe(wait / 1000.0)
+
+    def metrics(self):
+        """Snapshot of batch size and queue wait statistics"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["batch_size_counts"] = {str(k): v for k, v in sorted(self.stats["batch_size_counts"].items())}
+        frames = stats.pop("frames")
+        total_wait = stats.pop("total_wait_ms")
+        stats.update({
+            "frames": frames,
+            "queue_depth": self.queue.qsize(),
+            "config": {"max_batch_size": self.max_batch_size, "max_wait_ms": self.max_wait_ms},
+            "avg_batch_size": frames / stats["batches"] if stats["batches"] else 0.0,
+            "avg_wait_ms": total_wait / frames if frames else 0.0,
+        })
+        return stats
+
+class PredictionCache:
+    """Bounded LRU cache of prediction results with a time-to-live"""
+
+    def __init__(self, max_size=256, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(img_array):
+        """Content hash of the preprocessed 256x256 input"""
+        return hashlib.blake2b(img_array.tobytes(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return {part: dict(value) for part, value in entry[1].items()}
+
+    def put(self, key, results):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), {part: dict(value) for part, value in results.items()})
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+batcher = None
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL) if PREDICTION_CACHE_SIZE > 0 else None
+
+def run_models(img_array):
+    """Run inference on a preprocessed frame, through the batcher when enabled"""
+    if batcher is not None:
+        return batcher.predict(img_array)
+    return predict_batch(img_array)[0]
+
+def predict_all_models(pil_img):
+    """Predict using all loaded models"""
+    try:
+        img_array = preprocess_image(pil_img)
+        if prediction_cache is None:
+            return run_models(img_array)
+        cache_key = PredictionCache.key_for(img_array)
+        results = prediction_cache.get(cache_key)
+        if results is None:
+            results = run_models(img_array)
+            if all(value["status"] != "unknown" for value in results.values()):
+                prediction_cache.put(cache_key, results)
         return results
     except Exception as e:
         logger.error(f"Error in predict_all_models: {str(e)}")
         return {part: {"status": "unknown", "conf": 0.0} for part in models_info.keys()}
 
-def capture_real_3d_screenshot():
-    """Capture real 3D car viewer using Selenium"""
-    if not SELENIUM_AVAILABLE:
-        return False, "Selenium not available"
-    
+class FrameGate:
+    """Reuses a client's last results while its frames stay visually unchanged
+
+    A frame counts as unchanged when no thumbnail cell moved by `threshold` or
+    more. The largest cell change is used rather than the mean, so a small
+    local change such as one door opening is not averaged away by the rest
+    of the frame; JPEG noise and one-pixel jitter stay around 0.004-0.02.
+    """
+
+    THUMBNAIL_SIZE = (32, 32)
+
+    def __init__(self, threshold=0.03, max_age=120, max_clients=1024):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.max_clients = max_clients
+        self.clients = OrderedDict()
+        self.lock = threading.Lock()
+        self.reused = 0
+        self.computed = 0
+
+    @classmethod
+    def thumbnail(cls, pil_img):
+        """Cheap grayscale thumbnail used for the change check"""
+        small = pil_img.resize(cls.THUMBNAIL_SIZE, Image.BILINEAR, reducing_gap=2.0).convert("L")
+        return np.asarray(small, dtype=np.int16)
+
+    def lookup(self, client_id, thumb):
+        """Return the previous results if the frame has not changed, else None"""
+        with self.lock:
+            entry = self.clients.get(client_id)
+            if entry is not None:
+                self.clients.move_to_end(client_id)
+                last_thumb, results, stored_at = entry
+                fresh = time.monotonic() - stored_at <= self.max_age
+                difference = float(np.max(np.abs(thumb - last_thumb))) / 255.0
+                if fresh and difference < self.threshold:
+                    self.reused += 1
+                    return {part: dict(value) for part, value in results.items()}
+            self.computed += 1
+            return None
+
+    def store(self, client_id, thumb, results):
+        if any(value["status"] == "unknown" for value in results.values()):
+            return
+        with self.lock:
+            self.clients[client_id] = (thumb, {part: dict(value) for part, value in results.items()}, time.monotonic())
+            self.clients.move_to_end(client_id)
+            while len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "clients": len(self.clients),
+                "threshold": self.threshold,
+                "max_age_seconds": self.max_age,
+                "reused": self.reused,
+                "computed": self.computed,
+            }
+
+frame_gate = FrameGate(FRAME_DIFF_THRESHOLD, FRAME_GATE_MAX_AGE, FRAME_GATE_MAX_CLIENTS) if FRAME_DIFF_THRESHOLD > 0 else None
+
+def request_client_id():
+    """Identify the sending client for per-client frame gating"""
+    return request.headers.get("X-Client-Id") or request.args.get("client_id") or request.remote_addr or "anonymous"
+
+def predict_with_gate(pil_img, client_id):
+    """Predict, reusing the client's last results when the frame is unchanged
+
+    Returns (results, reused).
+    """
+    if frame_gate is None:
+        return predict_all_models(pil_img), False
+    thumb = FrameGate.thumbnail(pil_img)
+    results = frame_gate.lookup(client_id, thumb)
+    if results is not None:
+        return results, True
+    results = predict_all_models(pil_img)
+    frame_gate.store(client_id, thumb, results)
+    return results, False
+
+class StreamHub:
+    """Fans per-client result diffs out to Server-Sent-Events subscribers
+
+    State and subscribers live in this process only. Under serve.py a frame
+    may be handled by a different worker than the /stream connection, so the
+    diff is also returned from /stream/frame, computed against the state the
+    client reports it is showing.
+    """
+
+    def __init__(self, conf_delta=0.05, max_clients=1024):
+        self.conf_delta = conf_delta
+        self.max_clients = max_clients
+        self.state = OrderedDict()
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, client_id):
+        """Register a listener; returns its queue and the current full state"""
+        listener = queue.Queue(maxsize=64)
+        with self.lock:
+            self.subscribers.setdefault(client_id, set()).add(listener)
+            snapshot = {part: dict(value) for part, value in self.state.get(client_id, {}).items()}
+        return listener, snapshot
+
+    def unsubscribe(self, client_id, listener):
+        with self.lock:
+            listeners = self.subscribers.get(client_id)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del self.subscribers[client_id]
+
+    def diff(self, previous, results):
+        """Parts whose status changed or whose confidence moved by at least conf_delta"""
+        changed = {}
+        for part, value in results.items():
+            last = previous.get(part)
+            if (last is None or last["status"] != value["status"]
+                    or abs(last["conf"] - value["conf"]) >= self.conf_delta):
+                changed[part] = dict(value)
+        return changed
+
+    def publish(self, client_id, results, known=None):
+        """Record the client's latest results and push what changed to its listeners
+
+        Returns the parts that differ from `known`, the state the client says it
+        shows, or from this process's record of the client when it sent none.
+        """
+        with self.lock:
+            previous = self.state.pop(client_id, {})
+            changed = self.diff(previous, results)
+            previous.update(changed)
+            self.state[client_id] = previous
+            while len(self.state) > self.max_clients:
+                self.state.popitem(last=False)
+            listeners = list(self.subscribers.get(client_id, ()))
+        if changed:
+            for listener in listeners:
+                try:
+                    listener.put_nowait(changed)
+                except queue.Full:
+                    logger.warning(f"Stream listener for {client_id} is not keeping up, dropping update")
+        return self.diff(known, results) if known is not None else changed
+
+    def stats(self):
+        with self.lock:
+            return {
+                "clients": len(self.state),
+                "max_clients": self.max_clients,
+                "subscribers": sum(len(listeners) for listeners in self.subscribers.values()),
+            }
+
+stream_hub = StreamHub(STREAM_CONF_DELTA, STREAM_MAX_CLIENTS)
+
+def stream_known_state():
+    """The component states the client reports it is showing (X-Stream-State JSON header), if valid"""
     try:
-        chrome_options = Options()
+        known = json.loads(request.headers.get("X-Stream-State", "null"))
+    except ValueError:
+        return None
+    if not isinstance(known, dict):
+        return None
+    return {part: value for part, value in known.items()
+            if isinstance(value, dict) and isinstance(value.get("status"), str)
+            and isinstance(value.get("conf"), (int, float))}
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def decode_image_stream(stream, chunk_size=64 * 1024):
+    """Decode an image incrementally while reading it from a stream"""
+    parser = ImageFile.Parser()
+    received = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        received += len(chunk)
+        parser.feed(chunk)
+    if received == 0:
+        raise ValueError("No image data provided")
+    return parser.close()
+
+def read_request_image(draft_size=None):
+    """Decode the uploaded image from a raw body, a multipart upload or base64 JSON
+
+    When draft_size is given, JPEG frames are decoded at the smallest DCT
+    scale that still covers it instead of at full resolution.
+    """
+    if request.mimetype.startswith("image/") or request.mimetype == "application/octet-stream":
+        if draft_size:
+            body = request.get_data()
+            if not body:
+                raise ValueError("No image data provided")
+            pil_img = Image.open(BytesIO(body))
+        else:
+            # Decoded while streaming; time decode and conversion as one observation
+            with STAGE_LATENCY.time(stage="image_decode"):
+                return decode_image_stream(request.stream).convert("RGB")
+    elif request.files:
+        file = request.files.get("image") or next(iter(request.files.values()))
+        pil_img = Image.open(file.stream)
+    else:
+        data = request.get_json(silent=True)
+        if not data or "image" not in data:
+            raise ValueError("No image data provided")
+        img_data = data["image"]
+        if not img_data.startswith("data:image"):
+            raise ValueError("Invalid image format")
+        with STAGE_LATENCY.time(stage="base64_decode"):
+            img_bytes = base64.b64decode(img_data.split(",")[1])
+        pil_img = Image.open(BytesIO(img_bytes))
+    if draft_size and pil_img.format == "JPEG":
+        pil_img.draft("RGB", draft_size)
+    with STAGE_LATENCY.time(stage="image_decode"):
+        return pil_img.convert("RGB")
+
+PREDICT_BATCH_CHUNK_SIZE = int(os.environ.get("PREDICT_BATCH_CHUNK_SIZE", "32"))
+PREDICT_BATCH_MAX_IMAGES = int(os.environ.get("PREDICT_BATCH_MAX_IMAGES", "5000"))
+PREDICT_BATCH_DECODE_WORKERS = int(os.environ.get("PREDICT_BATCH_DECODE_WORKERS", "4"))
+ARCHIVE_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+batch_decode_pool = ThreadPoolExecutor(max_workers=PREDICT_BATCH_DECODE_WORKERS, thread_name_prefix="batch-decode")
+
+def iter_zip_images(stream):
+    with zipfile.ZipFile(stream) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and info.filename.lower().endswith(ARCHIVE_IMAGE_EXTENSIONS):
+                yield info.filename, archive.read(info)
+
+def iter_npz_images(stream):
+    """Every HxW(xC) uint8 array in an npz, with NxHxW(xC) arrays split into frames"""
+    with np.load(stream, allow_pickle=False) as arrays:
+        for key in arrays.files:
+            array = arrays[key]
+            if array.ndim == 4 or (array.ndim == 3 and array.shape[-1] not in (1, 3, 4)):
+                for i, frame in enumerate(array):
+                    yield f"{key}[{i}]", frame
+            else:
+                yield key, array
+
+def read_batch_sources():
+    """(name, stream, mimetype) for every uploaded file, or for the raw body
+
+    Uploads are read up front: Werkzeug closes them when the view returns,
+    before the streamed response has consumed them.
+    """
+    if request.files:
+        return [(file.filename or key, BytesIO(file.read()), file.mimetype)
+                for key in request.files for file in request.files.getlist(key)]
+    return [("body", BytesIO(request.get_data()), request.mimetype)]
+
+def iter_batch_items(sources):
+    """(name, payload) pairs from files and zip/npz archives; payload is encoded bytes or an array"""
+    for name, stream, mimetype in sources:
+        lower_name = name.lower()
+        if lower_name.endswith(".zip") or mimetype in ("application/zip", "application/x-zip-compressed"):
+            yield from iter_zip_images(stream)
+        elif lower_name.endswith(".npz") or mimetype == "application/x-npz":
+            yield from iter_npz_images(stream)
+        else:
+            yield name, stream.read()
+
+def decode_batch_item(payload):
+    """Decode one bulk item into a uint8 [1, 256, 256, 3] batch"""
+    if isinstance(payload, np.ndarray):
+        if payload.dtype != np.uint8:
+            raise ValueError(f"Arrays must be uint8, got {payload.dtype}")
+        pil_img = Image.fromarray(payload.squeeze(-1) if payload.ndim == 3 and payload.shape[-1] == 1 else payload)
+    else:
+        if not payload:
+            raise ValueError("Empty image")
+        pil_img = Image.open(BytesIO(payload))
+        if pil_img.format == "JPEG":
+            pil_img.draft("RGB", IMG_SIZE)
+    return preprocess_image(pil_img)
+
+def predict_batch_stream(items, chunk_size, max_images):
+    """NDJSON lines for every item, decoding the next chunk while the current one is inferred"""
+    start = time.perf_counter()
+    counts = {"images": 0, "errors": 0}
+    truncated = False
+    source_errors = []
+
+    def guarded_items():
+        # A corrupt archive ends the stream with an error in the summary instead of a broken response
+        try:
+            yield from items
+        except Exception as e:
+            logger.error(f"Could not read batch input: {str(e)}")
+            source_errors.append(str(e))
+
+    source = guarded_items()
+
+    def submit_chunk():
+        nonlocal truncated
+        chunk = []
+        for name, payload in source:
+            if counts["images"] + len(chunk) >= max_images:
+                truncated = True
+                break
+            chunk.append((counts["images"] + len(chunk), name, batch_decode_pool.submit(decode_batch_item, payload)))
+            if len(chunk) == chunk_size:
+                break
+        counts["images"] += len(chunk)
+        return chunk
+
+    pending = submit_chunk()
+    while pending:
+        decoded = []
+        for index, name, future in pending:
+            try:
+                decoded.append((index, name, future.result()))
+            except Exception as e:
+                counts["errors"] += 1
+                yield json.dumps({"index": index, "name": name, "error": str(e)}) + "\n"
+        next_chunk = submit_chunk() if not truncated else []
+        if decoded:
+            BATCH_SIZE.observe(len(decoded))
+            results = predict_batch(np.concatenate([img for _, _, img in decoded], axis=0))
+            for (index, name, _), predictions in zip(decoded, results):
+                yield json.dumps({"index": index, "name": name, "predictions": predictions}) + "\n"
+        pending = next_chunk
+
+    elapsed = time.perf_counter() - start
+    yield json.dumps({"summary": {
+        "images": counts["images"],
+        "errors": counts["errors"],
+        "truncated": truncated,
+        "error": source_errors[0] if source_errors else None,
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(counts["images"] / elapsed, 1) if elapsed else None,
+    }}) + "\n"
+
+IMAGE_CACHE_SIZE = int(os.environ.get("IMAGE_CACHE_SIZE", "16"))
+
+class ImageCache:
+    """Encoded images served from memory with their ETag and Last-Modified validators
+
+    File entries are keyed by path and reloaded only when the file's mtime or
+    size changes; writers can put() the bytes they just wrote so the next
+    request does not read them back. Generated images (placeholders) are
+    keyed by any hashable and rendered once.
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, key, data, version, modified):
+        entry = SimpleNamespace(
+            data=data,
+            etag=hashlib.blake2b(data, digest_size=16).hexdigest(),
+            last_modified=datetime.fromtimestamp(modified, tz=timezone.utc),
+            version=version,
+        )
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def _lookup(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.version != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put_file(self, path, data):
+        """Record the bytes just written to path"""
+        stat = os.stat(path)
+        return self._store(path, data, (stat.st_mtime_ns, stat.st_size), stat.st_mtime)
+
+    def get_file(self, path):
+        """Cached contents of path, or None when it does not exist"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self._lookup(path, version)
+        if entry is None:
+            with open(path, "rb") as f:
+                entry = self._store(path, f.read(), version, stat.st_mtime)
+        return entry
+
+    def get_generated(self, key, render):
+        """Cached result of render() (JPEG bytes) under key"""
+        entry = self._lookup(key, None)
+        if entry is None:
+            entry = self._store(key, render(), None, time.time())
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+image_cache = ImageCache(IMAGE_CACHE_SIZE)
+
+def cached_image_response(entry, mimetype="image/jpeg"):
+    """Serve a cache entry, answering 304 when the client's copy is still current"""
+    response = Response(entry.data, mimetype=mimetype)
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    # Dashboards poll these images: let browsers keep a copy but revalidate every time
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+VIEWER_URL = os.environ.get("VIEWER_URL", "https://euphonious-concha-ab5c5d.netlify.app/")
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "1"))
+BROWSER_POOL_WARM = os.environ.get("BROWSER_POOL_WARM", "1") == "1"
+BROWSER_READY_TIMEOUT = float(os.environ.get("BROWSER_READY_TIMEOUT", "15"))
+BROWSER_MAX_CAPTURES = int(os.environ.get("BROWSER_MAX_CAPTURES", "200"))
+# The viewer creates its WebGL canvas immediately and loads the car model
+# behind a "Loading Car Model..." overlay, so both are waited for
+VIEWER_MODEL_RESOURCE = os.environ.get("VIEWER_MODEL_RESOURCE", ".glb")
+VIEWER_LOADING_TEXT = os.environ.get("VIEWER_LOADING_TEXT", "Loading Car Model")
+
+# Ready once the page has a sized canvas, the model file has finished
+# downloading and the loading overlay is gone
+VIEWER_READY_SCRIPT = """
+const [resource, loadingText] = arguments;
+const canvas = document.querySelector('canvas');
+const modelLoaded = !resource || performance.getEntriesByType('resource')
+    .some(entry => entry.name.split('?')[0].endsWith(resource) && entry.responseEnd > 0);
+const loading = !!loadingText && document.body.innerText.includes(loadingText);
+return document.readyState === 'complete' && !!canvas && canvas.width > 0 && canvas.height > 0
+    && modelLoaded && !loading;
+"""
+# Wait for two animation frames so the latest render has been composited
+NEXT_FRAME_SCRIPT = """
+const done = arguments[arguments.length - 1];
+requestAnimationFrame(() => requestAnimationFrame(() => done(true)));
+"""
+
+class BrowserPool:
+    """Long-lived headless Chrome sessions parked on the viewer page, captured on demand
+
+    Sessions are launched lazily (or ahead of time by warm()), checked for
+    readiness before every screenshot and replaced when they fail or after
+    max_captures screenshots.
+    """
+
+    def __init__(self, url, size, ready_timeout, max_captures, window_size=(1200, 800)):
+        self.url = url
+        self.size = max(1, size)
+        self.ready_timeout = ready_timeout
+        self.max_captures = max(1, max_captures)
+        self.window_size = window_size
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.driver_path = None
+        self.live = 0
+        self.launched = 0
+        self.recycled = 0
+        self.captures = 0
+        self.failures = 0
+
+    def _launch(self):
+        sel = import_selenium()
+        chrome_options = sel.Options()
         chrome_options.add_argument("--headless")
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
         chrome_options.add_argument("--disable-web-security")
-        chrome_options.add_argument("--window-size=1200,800")
+        chrome_options.add_argument(f"--window-size={self.window_size[0]},{self.window_size[1]}")
         chrome_options.add_argument("--hide-scrollbars")
-        
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        logger.info("Loading 3D car viewer...")
-        driver.get("https://euphonious-concha-ab5c5d.netlify.app/")
-        
-        wait = WebDriverWait(driver, 15)
-        time.sleep(8)
-        
-        driver.save_screenshot(REAL_SCREENSHOT_FILE)
-        driver.quit()
-        
-        if os.path.exists(REAL_SCREENSHOT_FILE):
-            file_size = os.path.getsize(REAL_SCREENSHOT_FILE)
-            logger.info(f"Real 3D screenshot captured: {file_size} bytes")
-            return True, f"Success: {file_size} bytes"
+
+        with self.lock:
+            # Resolving the driver hits the network, do it once per process
+            if self.driver_path is None:
+                self.driver_path = sel.ChromeDriverManager().install()
+        driver = sel.webdriver.Chrome(service=sel.Service(self.driver_path), options=chrome_options)
+        try:
+            driver.set_script_timeout(self.ready_timeout)
+            logger.info(f"Loading 3D car viewer {self.url} in a pooled browser...")
+            driver.get(self.url)
+            self._wait_ready(driver)
+        except Exception:
+            driver.quit()
+            raise
+        with self.lock:
+            self.launched += 1
+        return SimpleNamespace(driver=driver, captures=0)
+
+    def _wait_ready(self, driver):
+        sel = import_selenium()
+        sel.WebDriverWait(driver, self.ready_timeout).until(
+            lambda d: d.execute_script(VIEWER_READY_SCRIPT, VIEWER_MODEL_RESOURCE, VIEWER_LOADING_TEXT))
+        driver.execute_async_script(NEXT_FRAME_SCRIPT)
+
+    def _screenshot(self, driver):
+        """Screenshot of the rendered viewer, retried while it is still blank (up to ready_timeout)"""
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            png_bytes = driver.get_screenshot_as_png()
+            if not is_blank_frame(Image.open(BytesIO(png_bytes)).convert("RGB")):
+                return png_bytes
+            if time.monotonic() >= deadline:
+                logger.warning("Viewer still blank after the ready timeout, capturing anyway")
+                return png_bytes
+            time.sleep(0.25)
+            driver.execute_async_script(NEXT_FRAME_SCRIPT)
+
+    def acquire(self):
+        """An idle session, a newly launched one while below size, or the next one released"""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            can_launch = self.live < self.size
+            if can_launch:
+                self.live += 1
+        if not can_launch:
+            try:
+                return self.idle.get(timeout=self.ready_timeout * 2)
+            except queue.Empty:
+                raise TimeoutError("No browser session became available")
+        try:
+            return self._launch()
+        except Exception:
+            with self.lock:
+                self.live -= 1
+            raise
+
+    def release(self, session):
+        if session.captures >= self.max_captures:
+            self.discard(session)
         else:
-            return False, "Screenshot file not created"
+            self.idle.put(session)
+
+    def discard(self, session):
+        with self.lock:
+            self.live -= 1
+            self.recycled += 1
+        try:
+            session.driver.quit()
+        except Exception as e:
+            logger.warning(f"Could not quit browser session: {str(e)}")
+
+    def capture(self):
+        """PNG screenshot of the viewer; a broken session is replaced and the capture retried once"""
+        for attempt in range(2):
+            session = self.acquire()
+            try:
+                # Doubles as the health check: a crashed or hung browser fails here
+                self._wait_ready(session.driver)
+                png_bytes = self._screenshot(session.driver)
+            except Exception as e:
+                logger.warning(f"Browser session unhealthy, recycling it: {str(e)}")
+                with self.lock:
+                    self.failures += 1
+                self.discard(session)
+                if attempt == 1:
+                    raise
+                continue
+            session.captures += 1
+            with self.lock:
+                self.captures += 1
+            self.release(session)
+            return png_bytes
+
+    def warm(self):
+        """Launch sessions up to the pool size on a background thread"""
+        def run():
+            while True:
+                with self.lock:
+                    if self.live >= self.size:
+                        return
+                    self.live += 1
+                try:
+                    self.idle.put(self._launch())
+                except Exception as e:
+                    with self.lock:
+                        self.live -= 1
+                    logger.error(f"Browser warmup failed: {str(e)}")
+                    return
+        threading.Thread(target=run, name="browser-warmup", daemon=True).start()
+
+    def close(self):
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(session)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "url": self.url,
+                "size": self.size,
+                "live": self.live,
+                "idle": self.idle.qsize(),
+                "launched": self.launched,
+                "recycled": self.recycled,
+                "captures": self.captures,
+                "failures": self.failures,
+            }
+
+browser_pool = BrowserPool(VIEWER_URL, BROWSER_POOL_SIZE, BROWSER_READY_TIMEOUT, BROWSER_MAX_CAPTURES)
+
+def capture_real_3d_screenshot():
+    """Capture real 3D car viewer from a pooled Selenium session"""
+    if not SELENIUM_AVAILABLE:
+        return False, "Selenium not available"
+    
+    try:
+        png_bytes = browser_pool.capture()
+        with STAGE_LATENCY.time(stage="jpeg_encode"):
+            buffer = BytesIO()
+            Image.open(BytesIO(png_bytes)).convert("RGB").save(buffer, "JPEG", quality=90)
+        with STAGE_LATENCY.time(stage="disk_write"):
+            tmp_path = REAL_SCREENSHOT_FILE + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp_path, REAL_SCREENSHOT_FILE)
+        image_cache.put_file(REAL_SCREENSHOT_FILE, buffer.getvalue())
+        
+        file_size = len(buffer.getvalue())
+        logger.info(f"Real 3D screenshot captured: {file_size} bytes")
+        return True, f"Success: {file_size} bytes"
             
     except Exception as e:
         logger.error(f"Real screenshot error: {str(e)}")
         return False, str(e)
 
+def run_real_3d_capture():
+    """Capture the viewer and run the part models on the screenshot"""
+    success, message = capture_real_3d_screenshot()
+    if not success:
+        raise RuntimeError(message)
+    # The capture process may still be loading its own models in the background
+    models_ready.wait()
+    entry = image_cache.get_file(REAL_SCREENSHOT_FILE)
+    predictions = predict_all_models(Image.open(BytesIO(entry.data)))
+    return {"message": message, "predictions": predictions, "file_size": len(entry.data)}
+
+CAPTURE_JOB_WORKERS = int(os.environ.get("CAPTURE_JOB_WORKERS", str(BROWSER_POOL_SIZE)))
+CAPTURE_JOB_QUEUE_SIZE = int(os.environ.get("CAPTURE_JOB_QUEUE_SIZE", "8"))
+CAPTURE_JOB_TTL = float(os.environ.get("CAPTURE_JOB_TTL", "600"))
+CAPTURE_JOB_DIR = os.environ.get("CAPTURE_JOB_DIR", os.path.join(UPLOAD_DIR, "jobs"))
+CAPTURE_JOB_POLL_INTERVAL = float(os.environ.get("CAPTURE_JOB_POLL_INTERVAL", "0.25"))
+CAPTURE_WAIT_TIMEOUT = float(os.environ.get("CAPTURE_WAIT_TIMEOUT", "110"))
+
+@contextmanager
+def locked_file(path):
+    """Exclusive lock on path shared by every process, e.g. all serve.py workers"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+class JobQueue:
+    """Runs submitted jobs on a bounded worker pool and keeps their status for polling
+
+    Job state lives in one JSON file per job under `directory`, so any serve.py
+    worker can accept a submission or answer a poll. Only the process holding
+    the leader lock runs jobs (and owns the browsers), on `workers` threads; the
+    others keep retrying the lock and take over if the leader exits. At most
+    `workers + queue_size` jobs may be queued or running, further submissions
+    are refused. Finished jobs are forgotten after `ttl` seconds.
+    """
+
+    JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+    def __init__(self, fn, directory, workers, queue_size, ttl, poll_interval=0.25, name="job"):
+        self.fn = fn
+        self.directory = directory
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.name = name
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.leader = False
+        self.leader_file = None
+        self.started = False
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        if not self.JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        return os.path.join(self.directory, job_id + ".json")
+
+    def _write(self, job):
+        path = self._path(job.id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(vars(job), f)
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return SimpleNamespace(**json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def _expired(self, job):
+        return job.finished is not None and time.time() - job.finished > self.ttl
+
+    def _jobs(self):
+        """All live jobs, oldest first; expired ones are deleted on the way"""
+        jobs = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            job = self._read(path)
+            if job is None:
+                continue
+            if self._expired(job):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            jobs.append(job)
+        return sorted(jobs, key=lambda job: job.created)
+
+    def submit(self):
+        """Queue a job; returns it, or None when the workers and the queue are full"""
+        with self.lock, locked_file(os.path.join(self.directory, ".submit.lock")):
+            active = sum(1 for job in self._jobs() if job.status in ("queued", "running"))
+            if active >= self.workers + self.queue_size:
+                self.rejected += 1
+                return None
+            job = SimpleNamespace(id=uuid.uuid4().hex, status="queued", created=time.time(),
+                                  started=None, finished=None, result=None, error=None)
+            self._write(job)
+            self.submitted += 1
+        self.wakeup.set()
+        return job
+
+    def get(self, job_id):
+        path = self._path(job_id)
+        if path is None:
+            return None
+        job = self._read(path)
+        if job is None or self._expired(job):
+            return None
+        return job
+
+    def wait(self, job_id, timeout):
+        """Poll a job until it finishes; returns it, or None if it vanished or is still pending after timeout"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.get(job_id)
+            if job is None or job.status in ("done", "failed"):
+                return job
+            time.sleep(self.poll_interval)
+        return None
+
+    def start(self, on_lead=None):
+        """Compete for the leader lock in the background; the winner calls on_lead and runs jobs"""
+        if self.started:
+            return
+        self.started = True
+        threading.Thread(target=self._elect, args=(on_lead,), name=f"{self.name}-leader", daemon=True).start()
+
+    def _elect(self, on_lead):
+        while True:
+            f = open(os.path.join(self.directory, ".leader.lock"), "a")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                f.close()
+                time.sleep(self.poll_interval)
+        # The lock is held for the life of the process and released by the OS when it exits
+        self.leader_file = f
+        with self.lock:
+            self.leader = True
+            self._fail_orphans()
+        logger.info(f"Process {os.getpid()} runs the {self.name} queue")
+        if on_lead is not None:
+            on_lead()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True).start()
+
+    def _fail_orphans(self):
+        """Jobs left running by a previous leader that exited will never finish"""
+        for job in self._jobs():
+            if job.status == "running":
+                job.status = "failed"
+                job.error = "Capture process exited before the job finished"
+                job.finished = time.time()
+                self._write(job)
+
+    def _claim(self):
+        with self.lock:
+            for job in self._jobs():
+                if job.status == "queued":
+                    job.status = "running"
+                    job.started = time.time()
+                    self._write(job)
+                    return job
+        return None
+
+    def _work(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            try:
+                job.result = self.fn()
+                job.status = "done"
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                job.error = str(e)
+                job.status = "failed"
+            job.finished = time.time()
+            self._write(job)
+            with self.lock:
+                if job.status == "done":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    @staticmethod
+    def describe(job):
+        def at(timestamp):
+            return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat() if timestamp is not None else None
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "created_at": at(job.created),
+            "started_at": at(job.started),
+            "finished_at": at(job.finished),
+            "queue_seconds": round((job.started or time.time()) - job.created, 3),
+            "run_seconds": round(job.finished - job.started, 3) if job.finished is not None and job.started else None,
+            "result": job.result,
+            "error": job.error,
+        }
+
+    def stats(self):
+        jobs = self._jobs()
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "running": sum(1 for job in jobs if job.status == "running"),
+                "queued": sum(1 for job in jobs if job.status == "queued"),
+                "leader": self.leader,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+capture_jobs = JobQueue(run_real_3d_capture, CAPTURE_JOB_DIR, CAPTURE_JOB_WORKERS, CAPTURE_JOB_QUEUE_SIZE,
+                        CAPTURE_JOB_TTL, CAPTURE_JOB_POLL_INTERVAL, name="capture-job")
+
 def create_enhanced_placeholder(width=1200, height=800):
     """Create enhanced placeholder with car detection overlay"""
     img = Image.new('RGB', (width, height), color='#f8f9fa')
@@ -172,6 +1539,190 @@ def create_enhanced_placeholder(width=1200, height=800):
     
     return img
 
+SCREENSHOT_QUEUE_SIZE = int(os.environ.get("SCREENSHOT_QUEUE_SIZE", "8"))
+SCREENSHOT_MAX_FILES = int(os.environ.get("SCREENSHOT_MAX_FILES", "200"))
+SCREENSHOT_MAX_BYTES = int(os.environ.get("SCREENSHOT_MAX_BYTES", str(200 * 1024 * 1024)))
+SCREENSHOT_ARCHIVE_SCALE = float(os.environ.get("SCREENSHOT_ARCHIVE_SCALE", "0"))
+SCREENSHOT_ARCHIVE_MAX_FILES = int(os.environ.get("SCREENSHOT_ARCHIVE_MAX_FILES", "2000"))
+SCREENSHOT_ARCHIVE_MAX_BYTES = int(os.environ.get("SCREENSHOT_ARCHIVE_MAX_BYTES", str(100 * 1024 * 1024)))
+
+def is_blank_frame(pil_img):
+    """Mean brightness check on a box-reduced copy, which keeps the mean of the full frame"""
+    small = pil_img.reduce(4) if min(pil_img.size) >= 16 else pil_img
+    return bool(np.mean(np.asarray(small)) > 240)
+
+class FileRing:
+    """Oldest-first set of files in one directory, bounded by file count and total bytes
+
+    The directory itself is the state: files are added and evicted under a file
+    lock after a fresh scan, so serve.py workers sharing it share one bound.
+    """
+
+    def __init__(self, directory, prefix, max_files, max_bytes):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.lock_path = os.path.join(directory, f".{prefix}ring.lock")
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+        with locked_file(self.lock_path):
+            self.enforce(self.scan())
+
+    def scan(self):
+        """(path, size) of the ring's files, oldest first"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if not (entry.name.startswith(self.prefix) and entry.name.endswith(".jpg")):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, entry.name, entry.path, stat.st_size))
+        return [(path, size) for _, _, path, size in sorted(files)]
+
+    def add(self, name, data):
+        """Write data as name and evict the oldest files over the limits; returns the path"""
+        path = os.path.join(self.directory, name)
+        with locked_file(self.lock_path):
+            with open(path, "wb") as f:
+                f.write(data)
+            self.enforce(self.scan())
+        return path
+
+    def enforce(self, files):
+        total_bytes = sum(size for _, size in files)
+        while files and (len(files) > self.max_files or total_bytes > self.max_bytes):
+            path, size = files.pop(0)
+            total_bytes -= size
+            try:
+                os.remove(path)
+                self.evicted += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove old screenshot {path}: {str(e)}")
+
+    def stats(self):
+        files = self.scan()
+        return {
+            "files": len(files),
+            "bytes": sum(size for _, size in files),
+            "max_files": self.max_files,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+        }
+
+class ScreenshotStore:
+    """Writes screenshots on a background thread into a bounded ring buffer
+
+    Every frame replaces output.jpg and is added to the enhanced_*.jpg ring;
+    with archive_scale > 0 a downsampled copy also goes to archive/.
+    """
+
+    def __init__(self, directory, latest_path, max_files, max_bytes, archive_scale=0,
+                 archive_max_files=2000, archive_max_bytes=100 * 1024 * 1024, queue_size=8):
+        self.directory = directory
+        self.latest_path = latest_path
+        self.ring = FileRing(directory, "enhanced_", max_files, max_bytes)
+        self.archive_scale = archive_scale
+        self.archive = (FileRing(os.path.join(directory, "archive"), "archive_", archive_max_files, archive_max_bytes)
+                        if archive_scale > 0 else None)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.last_name = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="screenshot-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, pil_img):
+        """Queue a frame for writing; returns a Future, or None when the writer is behind"""
+        future = Future()
+        try:
+            self.queue.put_nowait((pil_img, future))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            logger.warning("Screenshot writer queue full, skipping save")
+            return None
+        return future
+
+    def _run(self):
+        while True:
+            pil_img, future = self.queue.get()
+            try:
+                future.set_result(self.write(pil_img))
+            except Exception as e:
+                logger.error(f"Background screenshot write failed: {str(e)}")
+                future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    def _next_name(self, prefix):
+        # The pid keeps names from serve.py workers saving in the same millisecond apart
+        name = f"{prefix}{int(time.time() * 1000)}_{os.getpid()}.jpg"
+        if name == self.last_name:
+            name = f"{prefix}{int(time.time() * 1000)}_{os.getpid()}_{self.written}.jpg"
+        self.last_name = name
+        return name
+
+    def write(self, pil_img):
+        """Replace empty frames with a placeholder, encode once and write latest, ring and archive copies"""
+        enhanced = is_blank_frame(pil_img)
+        if enhanced:
+            logger.warning("Detected empty screenshot, creating enhanced placeholder")
+            pil_img = create_enhanced_placeholder(pil_img.width, pil_img.height)
+
+        with STAGE_LATENCY.time(stage="jpeg_encode"):
+            buffer = BytesIO()
+            pil_img.save(buffer, "JPEG", quality=90)
+            jpeg_bytes = buffer.getvalue()
+            archive_bytes = None
+            if self.archive is not None:
+                size = (max(1, int(pil_img.width * self.archive_scale)), max(1, int(pil_img.height * self.archive_scale)))
+                archive_buffer = BytesIO()
+                pil_img.resize(size, Image.BILINEAR, reducing_gap=2.0).save(archive_buffer, "JPEG", quality=75)
+                archive_bytes = archive_buffer.getvalue()
+
+        with self.lock:
+            with STAGE_LATENCY.time(stage="disk_write"):
+                # Per-process tmp file; the lock keeps the cached bytes paired with this write's mtime
+                tmp_path = f"{self.latest_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(jpeg_bytes)
+                with locked_file(self.latest_path + ".lock"):
+                    os.replace(tmp_path, self.latest_path)
+                    image_cache.put_file(self.latest_path, jpeg_bytes)
+                self.ring.add(self._next_name("enhanced_"), jpeg_bytes)
+                if archive_bytes is not None:
+                    self.archive.add(self._next_name("archive_"), archive_bytes)
+            self.written += 1
+
+        logger.info(f"Enhanced screenshot saved: {len(jpeg_bytes)} bytes")
+        return pil_img, enhanced, len(jpeg_bytes)
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                "ring": self.ring.stats(),
+                "archive": self.archive.stats() if self.archive is not None else None,
+                "archive_scale": self.archive_scale,
+                "written": self.written,
+                "dropped": self.dropped,
+                "queue_depth": self.queue.qsize(),
+            }
+        stats["disk_free_bytes"] = shutil.disk_usage(self.directory).free
+        return stats
+
+screenshot_store = ScreenshotStore(UPLOAD_DIR, OUTPUT_FILE, SCREENSHOT_MAX_FILES, SCREENSHOT_MAX_BYTES,
+                                   SCREENSHOT_ARCHIVE_SCALE, SCREENSHOT_ARCHIVE_MAX_FILES,
+                                   SCREENSHOT_ARCHIVE_MAX_BYTES, SCREENSHOT_QUEUE_SIZE)
+
 HTML_PAGE = """
 <!DOCTYPE html>
 <html>
@@ -410,6 +1961,7 @@ HTML_PAGE = """
             <button onclick="manualCapture()" id="captureBtn" class="btn-primary">Enhanced Screenshot</button>
             <button onclick="captureReal3D()" id="realCaptureBtn" class="btn-warning">Real 3D Capture</button>
             <button onclick="toggleAuto()" id="autoBtn" class="btn-secondary">Start Auto Mode</button>
+            <button onclick="toggleStream()" id="streamBtn" class="btn-secondary">Start Live Stream</button>
             <button onclick="clearLogs()" class="btn-secondary">Clear Logs</button>
             <a href="/latest.jpg" target="_blank" style="text-decoration: none;">
                 <button class="btn-primary">Download Screenshot</button>
@@ -459,6 +2011,12 @@ HTML_PAGE = """
         let totalCaptures = 0;
         let successfulCaptures = 0;
         let openComponentsCount = 0;
+        const clientId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : String(Math.random()).slice(2);
+        const STREAM_INTERVAL_MS = 2000;
+        const CAPTURE_POLL_MS = 1000;
+        let streamTimer = null;
+        let streamBusy = false;
+        let componentState = {};
         
         function log(message, type = 'INFO') {
             const logArea = document.getElementById('logArea');
@@ -514,64 +2072,57 @@ HTML_PAGE = """
             }
         }
         
+        async function captureFrame() {
+            const canvas = await html2canvas(document.body, {
+                allowTaint: true,
+                useCORS: true,
+                scale: 0.9,
+                width: window.innerWidth,
+                height: Math.max(document.body.scrollHeight, window.innerHeight),
+                scrollX: 0,
+                scrollY: 0,
+                backgroundColor: '#ffffff',
+                removeContainer: false,
+                logging: false
+            });
+            const jpegBlob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.9));
+            return { canvas, jpegBlob };
+        }
+        
         async function captureAndPredict() {
             totalCaptures++;
             
             try {
                 log('Starting enhanced webpage screenshot...', 'INFO');
                 
-                const canvas = await html2canvas(document.body, {
-                    allowTaint: true,
-                    useCORS: true,
-                    scale: 0.9,
-                    width: window.innerWidth,
-                    height: Math.max(document.body.scrollHeight, window.innerHeight),
-                    scrollX: 0,
-                    scrollY: 0,
-                    backgroundColor: '#ffffff',
-                    removeContainer: false,
-                    logging: false
-                });
-                
-                const dataURL = canvas.toDataURL('image/jpeg', 0.9);
+                const { canvas, jpegBlob } = await captureFrame();
                 log(`Enhanced canvas created: ${canvas.width}x${canvas.height}px`, 'SUCCESS');
                 
-                const response = await fetch('/save_screenshot', {
+                const response = await fetch('/save_and_predict', {
                     method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({ image: dataURL })
+                    headers: {'Content-Type': 'image/jpeg', 'X-Client-Id': clientId},
+                    body: jpegBlob
                 });
                 
                 if (response.ok) {
                     const result = await response.json();
-                    log(`Screenshot saved: ${result.size} bytes (${result.dimensions})`, 'SUCCESS');
+                    const predictions = result.predictions;
+                    log(`Screenshot ${result.saved} for saving (${result.dimensions})`, 'SUCCESS');
+                    log(result.reused ? 'View unchanged, previous AI results reused' : 'AI analysis completed successfully', 'SUCCESS');
+                    updateStatus(predictions);
+                    successfulCaptures++;
                     
-                    const predictResponse = await fetch('/predict', {
-                        method: 'POST',
-                        headers: {'Content-Type': 'application/json'},
-                        body: JSON.stringify({ image: dataURL })
-                    });
+                    const openParts = Object.entries(predictions)
+                        .filter(([_, data]) => data.status === 'open')
+                        .map(([part, _]) => part.replace('_', ' '));
                     
-                    if (predictResponse.ok) {
-                        const predictions = await predictResponse.json();
-                        log('AI analysis completed successfully', 'SUCCESS');
-                        updateStatus(predictions);
-                        successfulCaptures++;
-                        
-                        const openParts = Object.entries(predictions)
-                            .filter(([_, data]) => data.status === 'open')
-                            .map(([part, _]) => part.replace('_', ' '));
-                        
-                        if (openParts.length > 0) {
-                            log(`ALERT: Open detected - ${openParts.join(', ')}`, 'WARNING');
-                        } else {
-                            log('All components secure (closed)', 'SUCCESS');
-                        }
+                    if (openParts.length > 0) {
+                        log(`ALERT: Open detected - ${openParts.join(', ')}`, 'WARNING');
                     } else {
-                        log('AI prediction failed', 'ERROR');
+                        log('All components secure (closed)', 'SUCCESS');
                     }
                 } else {
-                    log('Screenshot upload failed', 'ERROR');
+                    log('Screenshot upload or AI prediction failed', 'ERROR');
                 }
             } catch (err) {
                 log(`System error: ${err.message}`, 'ERROR');
@@ -595,15 +2146,29 @@ HTML_PAGE = """
                 });
                 
                 if (response.ok) {
-                    const result = await response.json();
-                    log(`Real 3D capture completed: ${result.message}`, 'SUCCESS');
+                    const job = await response.json();
+                    log(`Real 3D capture queued as job ${job.job_id.slice(0, 8)}`, 'SYSTEM');
+                    
+                    let status = job;
+                    while (status.status === 'queued' || status.status === 'running') {
+                        await new Promise(resolve => setTimeout(resolve, CAPTURE_POLL_MS));
+                        const pollResponse = await fetch(job.status_url);
+                        status = await pollResponse.json();
+                        if (!pollResponse.ok) {
+                            status = {status: 'failed', error: status.error || `HTTP ${pollResponse.status}`};
+                        }
+                    }
                     
-                    if (result.predictions) {
+                    if (status.status === 'done') {
+                        const result = status.result;
+                        log(`Real 3D capture completed: ${result.message}`, 'SUCCESS');
                         updateStatus(result.predictions);
                         successfulCaptures++;
                         totalCaptures++;
                         updateStats();
                         log('AI analysis on real 3D model completed', 'SUCCESS');
+                    } else {
+                        log(`Real 3D capture failed: ${status.error || 'unknown error'}`, 'ERROR');
                     }
                 } else {
                     const error = await response.json();
@@ -654,6 +2219,67 @@ HTML_PAGE = """
             }
         }
         
+        function applyStreamUpdate(changed) {
+            Object.assign(componentState, changed);
+            updateStatus(componentState);
+            updateStats();
+            Object.entries(changed).forEach(([part, data]) => {
+                log(`${part.replace('_', ' ')} is now ${data.status.toUpperCase()} (${(data.conf * 100).toFixed(1)}%)`,
+                    data.status === 'open' ? 'WARNING' : 'INFO');
+            });
+        }
+        
+        async function streamFrame() {
+            if (streamBusy) return;
+            streamBusy = true;
+            totalCaptures++;
+            try {
+                const { jpegBlob } = await captureFrame();
+                // The diff comes back on this response, so it works whichever worker handles the frame
+                const response = await fetch('/stream/frame', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'image/jpeg',
+                        'X-Client-Id': clientId,
+                        'X-Stream-State': JSON.stringify(componentState)
+                    },
+                    body: jpegBlob
+                });
+                if (response.ok) {
+                    successfulCaptures++;
+                    const result = await response.json();
+                    if (Object.keys(result.changed).length) applyStreamUpdate(result.changed);
+                    else updateStats();
+                } else {
+                    const error = await response.json();
+                    log(`Stream frame failed: ${error.error}`, 'ERROR');
+                }
+            } catch (err) {
+                log(`Stream frame error: ${err.message}`, 'ERROR');
+            }
+            streamBusy = false;
+        }
+        
+        function toggleStream() {
+            const btn = document.getElementById('streamBtn');
+            
+            if (!streamTimer) {
+                streamTimer = setInterval(streamFrame, STREAM_INTERVAL_MS);
+                streamFrame();
+                btn.textContent = 'Stop Live Stream';
+                btn.className = 'btn-danger';
+                document.getElementById('detectionMode').textContent = `Live stream (${STREAM_INTERVAL_MS / 1000}s frames)`;
+                log('Live stream started, only changed components are reported', 'SYSTEM');
+            } else {
+                clearInterval(streamTimer);
+                streamTimer = null;
+                btn.textContent = 'Start Live Stream';
+                btn.className = 'btn-secondary';
+                document.getElementById('detectionMode').textContent = 'Manual';
+                log('Live stream stopped', 'SYSTEM');
+            }
+        }
+        
         function clearLogs() {
             const logArea = document.getElementById('logArea');
             logArea.innerHTML = '<strong>AI CAR DETECTION SYSTEM v2.0</strong><br>' +
@@ -683,116 +2309,198 @@ def index():
     return render_template_string(HTML_PAGE)
 
 @app.route("/predict", methods=["POST"])
+@require_models_ready
 def predict():
     """AI Prediction with enhanced error handling"""
     try:
-        data = request.get_json()
-        if not data or "image" not in data:
-            logger.error("No image data received")
-            return jsonify({"error": "No image data provided"}), 400
-
-        img_data = data["image"]
-        if not img_data.startswith("data:image"):
-            logger.error("Invalid image format")
-            return jsonify({"error": "Invalid image format"}), 400
-
-        img_base64 = img_data.split(",")[1]
-        img_bytes = base64.b64decode(img_base64)
-        pil_img = Image.open(BytesIO(img_bytes)).convert("RGB")
+        try:
+            pil_img = read_request_image(draft_size=IMG_SIZE)
+        except ValueError as e:
+            logger.error(f"Invalid prediction request: {str(e)}")
+            return jsonify({"error": str(e)}), 400
         
-        results = predict_all_models(pil_img)
-        logger.info(f"AI Prediction: {results}")
-        return jsonify(results)
+        results, reused = predict_with_gate(pil_img, request_client_id())
+        logger.info(f"AI Prediction{' (reused)' if reused else ''}: {results}")
+        response = jsonify(results)
+        response.headers["X-Prediction-Reused"] = "1" if reused else "0"
+        return response
         
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
 
+@app.route("/predict_batch", methods=["POST"])
+@require_models_ready
+def predict_batch_endpoint():
+    """Bulk prediction over multipart files or a zip/npz archive, streamed back as NDJSON"""
+    try:
+        if not request.files and not request.content_length:
+            return jsonify({"error": "No images provided"}), 400
+        chunk_size = min(max(request.args.get("chunk_size", PREDICT_BATCH_CHUNK_SIZE, type=int), 1), 256)
+        items = iter_batch_items(read_batch_sources())
+        return Response(stream_with_context(predict_batch_stream(items, chunk_size, PREDICT_BATCH_MAX_IMAGES)),
+                        mimetype="application/x-ndjson")
+        
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        return jsonify({"error": f"Batch prediction failed: {str(e)}"}), 500
+
 @app.route("/save_screenshot", methods=["POST"])
 def save_screenshot():
     """Enhanced screenshot saving with placeholder generation"""
     try:
-        data = request.get_json()
-        if not data or "image" not in data:
-            return jsonify({"error": "No image data"}), 400
-            
-        img_data = data["image"]
-        if not img_data.startswith("data:image"):
-            return jsonify({"error": "Invalid format"}), 400
-            
-        img_base64 = img_data.split(",")[1]
-        img_bytes = base64.b64decode(img_base64)
-        
-        pil_img = Image.open(BytesIO(img_bytes)).convert("RGB")
-        
-        img_array = np.array(pil_img)
-        avg_brightness = np.mean(img_array)
-        
-        if avg_brightness > 240:
-            logger.warning("Detected empty screenshot, creating enhanced placeholder")
-            pil_img = create_enhanced_placeholder(pil_img.width, pil_img.height)
-        
-        pil_img.save(OUTPUT_FILE, "JPEG", quality=90)
-        
-        timestamped_file = os.path.join(UPLOAD_DIR, f"enhanced_{int(time.time())}.jpg")
-        pil_img.save(timestamped_file, "JPEG", quality=90)
+        try:
+            pil_img = read_request_image()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        file_size = os.path.getsize(OUTPUT_FILE)
-        logger.info(f"Enhanced screenshot saved: {file_size} bytes")
+        if request.args.get("wait") == "1":
+            pil_img, enhanced, file_size = screenshot_store.write(pil_img)
+            queued = False
+        else:
+            enhanced = is_blank_frame(pil_img)
+            queued = screenshot_store.submit(pil_img) is not None
+            if not queued:
+                return jsonify({"error": "Screenshot writer is busy, try again"}), 503
+            file_size = None
         
         return jsonify({
             "status": "success", 
             "size": file_size,
+            "queued": queued,
             "dimensions": f"{pil_img.width}x{pil_img.height}",
-            "enhanced": avg_brightness > 240
+            "enhanced": enhanced
         })
         
     except Exception as e:
         logger.error(f"Screenshot error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/save_and_predict", methods=["POST"])
+@require_models_ready
+def save_and_predict():
+    """Decode one upload, predict on it and persist it in the background"""
+    try:
+        try:
+            pil_img = read_request_image()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        results, reused = predict_with_gate(pil_img, request_client_id())
+        logger.info(f"AI Prediction{' (reused)' if reused else ''}: {results}")
+        queued = screenshot_store.submit(pil_img) is not None
+        
+        return jsonify({
+            "status": "success",
+            "predictions": results,
+            "reused": reused,
+            "dimensions": f"{pil_img.width}x{pil_img.height}",
+            "saved": "queued" if queued else "skipped"
+        })
+        
+    except Exception as e:
+        logger.error(f"Save and predict error: {str(e)}")
+        return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+
+@app.route("/stream")
+def stream():
+    """Server-Sent-Events channel pushing only changed component states for one client"""
+    client_id = request_client_id()
+    listener, snapshot = stream_hub.subscribe(client_id)
+
+    def events():
+        try:
+            yield sse_event("snapshot", snapshot)
+            while True:
+                try:
+                    changed = listener.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event("diff", changed)
+        finally:
+            stream_hub.unsubscribe(client_id, listener)
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/stream/frame", methods=["POST"])
+@require_models_ready
+def stream_frame():
+    """Accept one streamed frame and return the changed parts; /stream subscribers in this process get them too"""
+    try:
+        try:
+            pil_img = read_request_image(draft_size=IMG_SIZE)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        client_id = request_client_id()
+        results, reused = predict_with_gate(pil_img, client_id)
+        changed = stream_hub.publish(client_id, results, stream_known_state())
+        response = jsonify({"changed": changed, "reused": reused})
+        response.headers["X-Prediction-Reused"] = "1" if reused else "0"
+        return response
+    except Exception as e:
+        logger.error(f"Stream frame error: {str(e)}")
+        return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+
 @app.route("/capture_real_3d", methods=["POST"])
+@require_models_ready
 def capture_real_3d_endpoint():
-    """Real 3D capture endpoint using Selenium"""
+    """Queue a real 3D capture and return its job id; ?wait=1 waits for the result"""
     try:
-        success, message = capture_real_3d_screenshot()
+        if not SELENIUM_AVAILABLE:
+            return jsonify({"status": "error", "error": "Selenium not available"}), 500
         
-        if success:
-            with open(REAL_SCREENSHOT_FILE, 'rb') as f:
-                img_bytes = f.read()
-                pil_img = Image.open(BytesIO(img_bytes))
-                predictions = predict_all_models(pil_img)
-            
-            return jsonify({
-                "status": "success",
-                "message": message,
-                "predictions": predictions,
-                "file_size": os.path.getsize(REAL_SCREENSHOT_FILE)
-            })
-        else:
-            return jsonify({
-                "status": "error",
-                "error": message
-            }), 500
+        job = capture_jobs.submit()
+        if job is None:
+            return jsonify({"error": "Too many captures queued, try again"}), 503
+        status_url = f"/capture_real_3d/{job.id}"
+        
+        if request.args.get("wait") == "1":
+            # Captures always run in the process that owns the browsers, even when waiting
+            finished = capture_jobs.wait(job.id, CAPTURE_WAIT_TIMEOUT)
+            if finished is None:
+                return jsonify({"status": "error", "error": "Capture still pending, poll status_url",
+                                "job_id": job.id, "status_url": status_url}), 504, {"Location": status_url}
+            if finished.status != "done":
+                return jsonify({"status": "error", "error": finished.error}), 500
+            return jsonify({"status": "success", **finished.result})
+        
+        return jsonify({"status": "queued", "job_id": job.id, "status_url": status_url}), 202, {"Location": status_url}
             
     except Exception as e:
         logger.error(f"Real 3D capture error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/capture_real_3d/<job_id>")
+def capture_real_3d_job(job_id):
+    """Status of a queued real 3D capture, with predictions once it is done"""
+    job = capture_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(JobQueue.describe(job))
+
+def placeholder_jpeg(width, height):
+    placeholder = create_enhanced_placeholder(width, height)
+    placeholder_io = BytesIO()
+    placeholder.save(placeholder_io, 'JPEG', quality=90)
+    return placeholder_io.getvalue()
+
 @app.route("/latest.jpg")
 def latest_screenshot():
-    """Serve latest screenshot with fallback"""
+    """Serve latest screenshot with fallback, from memory and with 304 support"""
     try:
-        if os.path.exists(REAL_SCREENSHOT_FILE) and os.path.getsize(REAL_SCREENSHOT_FILE) > 1000:
-            return send_file(REAL_SCREENSHOT_FILE, mimetype="image/jpeg")
-        elif os.path.exists(OUTPUT_FILE):
-            return send_file(OUTPUT_FILE, mimetype="image/jpeg")
-        else:
-            placeholder = create_enhanced_placeholder()
-            placeholder_io = BytesIO()
-            placeholder.save(placeholder_io, 'JPEG', quality=90)
-            placeholder_io.seek(0)
-            return send_file(placeholder_io, mimetype="image/jpeg")
+        entry = image_cache.get_file(REAL_SCREENSHOT_FILE)
+        if entry is None or len(entry.data) <= 1000:
+            entry = image_cache.get_file(OUTPUT_FILE)
+        if entry is None:
+            width = min(max(request.args.get("width", 1200, type=int), 320), 1920)
+            height = min(max(request.args.get("height", 800, type=int), 240), 1080)
+            entry = image_cache.get_generated(("placeholder", width, height),
+                                              lambda: placeholder_jpeg(width, height))
+        return cached_image_response(entry)
     except Exception as e:
         logger.error(f"Error serving screenshot: {str(e)}")
         return f"Error: {str(e)}", 500
@@ -801,13 +2509,44 @@ def latest_screenshot():
 def real_3d_screenshot():
     """Serve real 3D screenshot specifically"""
     try:
-        if os.path.exists(REAL_SCREENSHOT_FILE):
-            return send_file(REAL_SCREENSHOT_FILE, mimetype="image/jpeg")
-        else:
+        entry = image_cache.get_file(REAL_SCREENSHOT_FILE)
+        if entry is None:
             return "Real 3D screenshot not available", 404
+        return cached_image_response(entry)
     except Exception as e:
         return f"Error: {str(e)}", 500
 
+@app.route("/ready")
+def ready():
+    """Readiness probe with per-model load state and timings"""
+    is_ready = models_ready.is_set()
+    return jsonify({
+        "ready": is_ready,
+        "backend": MODEL_BACKEND,
+        "models": model_status,
+        "load_ms": startup_info["load_ms"],
+        "warmup_ms": startup_info["warmup_ms"],
+        "seconds_to_ready": round(startup_info["ready_at"] - startup_info["started_at"], 2) if is_ready else None,
+        "error": startup_info["error"]
+    }), 200 if is_ready else 503
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics for the prediction and screenshot hot paths"""
+    extra = [("car_models_ready", "gauge", "1 once all models are loaded and warmed up",
+              [f"car_models_ready {int(models_ready.is_set())}"])]
+    if prediction_cache is not None:
+        stats = prediction_cache.stats()
+        extra.append(("car_prediction_cache_lookups_total", "counter", "Prediction cache lookups by result",
+                      [f'car_prediction_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+                       f'car_prediction_cache_lookups_total{{result="miss"}} {stats["misses"]}']))
+    if frame_gate is not None:
+        stats = frame_gate.stats()
+        extra.append(("car_frame_gate_total", "counter", "Frames answered from the previous result vs computed",
+                      [f'car_frame_gate_total{{result="reused"}} {stats["reused"]}',
+                       f'car_frame_gate_total{{result="computed"}} {stats["computed"]}']))
+    return Response(render_metrics(extra), mimetype="text/plain; version=0.0.4")
+
 @app.route("/status")
 def status():
     """Enhanced system status"""
@@ -815,27 +2554,59 @@ def status():
         return jsonify({
             "status": "running",
             "version": "2.0",
+            "pid": os.getpid(),
             "models_loaded": len(models),
             "models": list(models.keys()),
+            "backend": MODEL_BACKEND,
+            "fused_inference": fused_model is not None,
+            "batching": batcher.metrics() if batcher is not None else None,
+            "prediction_cache": prediction_cache.stats() if prediction_cache is not None else None,
+            "frame_gate": frame_gate.stats() if frame_gate is not None else None,
+            "streaming": stream_hub.stats(),
             "selenium_available": SELENIUM_AVAILABLE,
+            "browser_pool": browser_pool.stats() if SELENIUM_AVAILABLE else None,
+            "capture_jobs": capture_jobs.stats(),
             "screenshots": {
                 "regular": os.path.exists(OUTPUT_FILE),
                 "real_3d": os.path.exists(REAL_SCREENSHOT_FILE)
             },
+            "storage": screenshot_store.stats(),
+            "image_cache": image_cache.stats(),
             "tensorflow_version": tf.__version__,
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-load_models()
+def start_worker_threads(captures=True):
+    """Start the batching and screenshot writer threads, and with captures the capture job runner, for this process"""
+    global batcher
+    if USE_BATCHING:
+        batcher = MicroBatcher(predict_batch, PREDICT_MAX_BATCH_SIZE, PREDICT_MAX_WAIT_MS)
+    screenshot_store.start()
+    if captures and SELENIUM_AVAILABLE:
+        # Only the process that wins the capture lock runs jobs and warms browsers
+        capture_jobs.start(on_lead=browser_pool.warm if BROWSER_POOL_WARM else None)
+    atexit.register(browser_pool.close)
+
+def start_service(background_loading=LOAD_MODELS_IN_BACKGROUND, captures=True):
+    """Load the models and start the background threads for this process"""
+    if background_loading:
+        start_model_loading()
+    elif not models_ready.is_set():
+        load_models()
+    start_worker_threads(captures)
+
+# serve.py sets APP_AUTOSTART=0 so it can decide what to load before forking workers
+if os.environ.get("APP_AUTOSTART", "1") == "1":
+    start_service()
 
 if __name__ == "__main__":
     logger.info("=" * 60)
     logger.info("AI CAR DETECTION SYSTEM v2.0")
     logger.info("=" * 60)
     logger.info(f"Screenshots: {UPLOAD_DIR}")
-    logger.info(f"Models: {list(models.keys())}")
+    logger.info(f"Models: {list(models_info.keys())} ({'loading in background' if not models_ready.is_set() else 'ready'})")
     logger.info(f"TensorFlow: {tf.__version__}")
     logger.info(f"Selenium: {'Available' if SELENIUM_AVAILABLE else 'Not Available'}")
     logger.info(f"Server: http://127.0.0.1:5000")
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from io import BytesIO
+from datetime import datetime
+import numpy as np
+from PIL import Image
+
+# Measure the real work: no result cache or frame gating, and no browser pool
+# competing for the CPU; models are loaded before timing starts
+os.environ.setdefault("PREDICTION_CACHE_SIZE", "0")
+os.environ.setdefault("FRAME_DIFF_THRESHOLD", "0")
+os.environ["APP_AUTOSTART"] = "0"
+os.environ["BROWSER_POOL_WARM"] = "0"
+import app
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads", "car.jpg")
+
+def time_calls(fn, img_array, iterations, warmup=3):
+    """Time repeated calls of fn on the same input, returning latencies in ms"""
+    for _ in range(warmup):
+        fn(img_array)
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(img_array)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+def summarize(name, latencies):
+    return {
+        "name": name,
+        "n": int(len(latencies)),
+        "mean": float(np.mean(latencies)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+    }
+
+def predict_with_keras_loop(img_array):
+    """Baseline: one model.predict call per part, as the server used to do"""
+    img_float = img_array.astype(np.float32) / 255.0
+    return [{part: app.format_prediction(model.predict(img_float, verbose=0)[0][0])
+             for part, model in app.models.items()}]
+
+def compare_loop_and_fused(iterations):
+    """Benchmark model.predict and the compiled per-model loop against the fused graph"""
+    pil_img = Image.open(SAMPLE_IMAGE).convert("RGB")
+    img_array = app.preprocess_image(pil_img)
+
+    if app.fused_model is None:
+        app.build_fused_model()
+
+    rows = [
+        summarize("model.predict x%d" % len(app.models), time_calls(predict_with_keras_loop, img_array, iterations)),
+        summarize("compiled loop x%d" % len(app.models), time_calls(app.predict_with_loop, img_array, iterations)),
+        summarize("fused (single graph)", time_calls(app.predict_with_fused, img_array, iterations)),
+    ]
+
+    print(f"\n{'mode':<32}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for row in rows:
+        print(f"{row['name']:<32}{row['mean']:>10.2f}{row['p50']:>10.2f}{row['p99']:>10.2f}")
+    print(f"\nSpeedup vs model.predict (mean): {rows[0]['mean'] / rows[-1]['mean']:.2f}x")
+
+    loop_results = predict_with_keras_loop(img_array)[0]
+    fused_results = app.predict_with_fused(img_array)[0]
+    for part in app.models.keys():
+        if loop_results[part]["status"] != fused_results[part]["status"]:
+            print(f"WARNING: {part} differs between loop and fused mode")
+    return rows
+
+def preprocess_full_float(jpeg_bytes):
+    """Baseline: full-size decode, PIL resize, float array divided by 255"""
+    pil_img = Image.open(BytesIO(jpeg_bytes)).convert("RGB")
+    img = pil_img.resize(app.IMG_SIZE)
+    img_array = np.asarray(img, dtype=np.float32)
+    return np.expand_dims(img_array, axis=0) / 255.0
+
+def preprocess_draft_uint8(jpeg_bytes):
+    """Draft-mode JPEG decode kept as uint8 until it reaches the model"""
+    pil_img = Image.open(BytesIO(jpeg_bytes))
+    pil_img.draft("RGB", app.IMG_SIZE)
+    return app.preprocess_image(pil_img)
+
+def decoded_kb(jpeg_bytes, draft):
+    """Size of the RGB buffer Pillow decodes into, which draft mode shrinks
+
+    tracemalloc cannot see Pillow's C-level decode buffers, so the size is
+    computed from the decoded dimensions instead.
+    """
+    pil_img = Image.open(BytesIO(jpeg_bytes))
+    if draft:
+        pil_img.draft("RGB", app.IMG_SIZE)
+    width, height = pil_img.size
+    return width * height * 3 / 1024
+
+def synthetic_jpeg(width, height, quality=90):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+def compare_preprocessing(iterations):
+    """Benchmark full-resolution float preprocessing against draft-mode uint8"""
+    frames = [("car.jpg", open(SAMPLE_IMAGE, "rb").read())]
+    frames += [(f"synthetic {w}x{h}", synthetic_jpeg(w, h)) for w, h in [(800, 600), (1200, 800), (1920, 1080)]]
+
+    print(f"\n{'frame':<22}{'mode':<14}{'p50 ms':>10}{'p99 ms':>10}{'decoded KiB':>14}")
+    for name, jpeg_bytes in frames:
+        for mode, fn, draft in [("full/float", preprocess_full_float, False), ("draft/uint8", preprocess_draft_uint8, True)]:
+            row = summarize(mode, time_calls(fn, jpeg_bytes, iterations))
+            print(f"{name:<22}{mode:<14}{row['p50']:>10.2f}{row['p99']:>10.2f}{decoded_kb(jpeg_bytes, draft):>14.0f}")
+
+SUITE_FRAME_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+SUITE_BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+
+def suite_frames():
+    frames = [("car.jpg", open(SAMPLE_IMAGE, "rb").read())]
+    frames += [(f"synthetic_{w}x{h}", synthetic_jpeg(w, h)) for w, h in SUITE_FRAME_SIZES]
+    return frames
+
+def decode_full(jpeg_bytes):
+    return Image.open(BytesIO(jpeg_bytes)).convert("RGB")
+
+def run_suite(iterations, batch_sizes=SUITE_BATCH_SIZES):
+    """Time decode, preprocessing, per-model and whole-set inference and the /predict route"""
+    results = {}
+
+    def record(key, fn, payload, n=iterations):
+        results[key] = summarize(key, time_calls(fn, payload, n))
+        row = results[key]
+        print(f"{key:<48}{row['p50']:>10.2f}{row['p99']:>10.2f}")
+
+    print(f"\n{'benchmark':<48}{'p50 ms':>10}{'p99 ms':>10}")
+    frames = suite_frames()
+    for name, jpeg_bytes in frames:
+        record(f"decode/{name}", decode_full, jpeg_bytes)
+        record(f"preprocess/{name}", preprocess_draft_uint8, jpeg_bytes)
+
+    img_array = preprocess_draft_uint8(frames[0][1])
+    for batch_size in batch_sizes:
+        img_batch = np.repeat(img_array, batch_size, axis=0)
+        # Fewer repetitions for big batches keeps the suite's runtime roughly flat
+        n = max(5, iterations // batch_size)
+        for part, fn in app.inference_fns.items():
+            if isinstance(fn, app.TFLiteModel):
+                record(f"model/{part}/batch_{batch_size}", fn, img_batch, n)
+            else:
+                img_tensor = app.tf.convert_to_tensor(img_batch)
+                record(f"model/{part}/batch_{batch_size}", fn, img_tensor, n)
+        record(f"all_models/batch_{batch_size}", app.predict_batch, img_batch, n)
+
+    client = app.app.test_client()
+    for name, jpeg_bytes in frames:
+        record(f"route/predict/{name}",
+               lambda body: client.post("/predict", data=body, content_type="image/jpeg"), jpeg_bytes)
+    return results
+
+def suite_metadata():
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "tensorflow": app.tf.__version__,
+        "backend": app.MODEL_BACKEND,
+        "fused_inference": app.fused_model is not None,
+        "batching": app.batcher is not None,
+    }
+
+def find_regressions(results, baseline, tolerance):
+    """Benchmarks whose p50 or p99 grew by more than tolerance (a fraction) over the baseline"""
+    regressions = []
+    for key, row in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for stat in ("p50", "p99"):
+            if base[stat] > 0 and row[stat] > base[stat] * (1 + tolerance):
+                regressions.append((key, stat, base[stat], row[stat]))
+    return regressions
+
+def run_suite_cli(args):
+    results = run_suite(args.iterations)
+    report = {"metadata": suite_metadata(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"No p50/p99 regressions beyond {args.tolerance:.0%} against {args.baseline}")
+        return 0
+    print(f"\nREGRESSIONS against {args.baseline} (tolerance {args.tolerance:.0%}):")
+    for key, stat, before, after in regressions:
+        print(f"  {key} {stat}: {before:.2f} ms -> {after:.2f} ms (+{(after / before - 1):.0%})")
+    return 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark part classifier inference")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--mode", choices=["suite", "inference", "preprocess", "all"], default="suite")
+    parser.add_argument("--output", help="write suite results as JSON to this file")
+    parser.add_argument("--baseline", help="baseline JSON to compare against (created if missing)")
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p50/p99 slowdown, as a fraction")
+    args = parser.parse_args()
+    app.start_service(background_loading=False, captures=False)
+    if args.mode in ("inference", "all"):
+        compare_loop_and_fused(args.iterations)
+    if args.mode in ("preprocess", "all"):
+        compare_preprocessing(args.iterations)
+    if args.mode == "suite":
+        sys.exit(run_suite_cli(args))
@@ -0,0 +1,138 @@
+import os
+import time
+import random
+import argparse
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+# Only the preprocessing helpers are needed: no model loading, batching, screenshot or browser threads
+os.environ.setdefault("MODEL_BACKEND", "keras")
+os.environ["APP_AUTOSTART"] = "0"
+os.environ["BROWSER_POOL_WARM"] = "0"
+import app
+
+VARIANTS = ["float16", "int8"]
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def list_labelled_images(part_dir):
+    """(path, label) pairs from a <part>/<class>/ folder, labels follow app.class_names"""
+    samples = []
+    for label, class_name in enumerate(app.class_names):
+        class_dir = os.path.join(part_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for file in sorted(os.listdir(class_dir)):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_dir, file), label))
+    return samples
+
+def load_batch(paths):
+    """Load images the same way the server does, as a uint8 batch"""
+    return np.concatenate([app.preprocess_image(Image.open(path)) for path in paths], axis=0)
+
+def representative_dataset(paths):
+    def generator():
+        for path in paths:
+            yield [app.preprocess_image(Image.open(path)).astype(np.float32) / 255.0]
+    return generator
+
+def convert(model, variant, calibration_paths):
+    """Convert a keras model to a float16 or int8 post-training-quantised TFLite flatbuffer"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        if not calibration_paths:
+            raise ValueError("int8 quantisation needs calibration images")
+        converter.representative_dataset = representative_dataset(calibration_paths)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+def measure(predict_fn, img_batch, labels, iterations):
+    """Accuracy on the evaluation images and single-frame latency in ms"""
+    scores = np.concatenate([np.asarray(predict_fn(img_batch[i:i + 1]))[:, 0] for i in range(len(img_batch))])
+    accuracy = float(np.mean((scores > 0.5).astype(int) == labels)) if len(labels) else float("nan")
+    latencies = []
+    for i in range(iterations):
+        frame = img_batch[i % len(img_batch):i % len(img_batch) + 1]
+        start = time.perf_counter()
+        predict_fn(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return scores, accuracy, float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+def export_part(part, args):
+    """Export one part model and return its comparison rows"""
+    keras_path = app.models_info[part]
+    if not os.path.exists(keras_path):
+        print(f"Skipping {part}: {keras_path} not found")
+        return []
+    model = tf.keras.models.load_model(keras_path)
+
+    samples = list_labelled_images(os.path.join(args.data_root, part))
+    random.Random(42).shuffle(samples)
+    # Calibration and evaluation images must not overlap; with too few images
+    # the calibration set gives up half of them to evaluation
+    n_calibration = args.calibration_samples
+    if len(samples) < args.calibration_samples + args.eval_samples:
+        n_calibration = min(args.calibration_samples, len(samples) // 2)
+    calibration = [path for path, _ in samples[:n_calibration]]
+    evaluation = samples[n_calibration:n_calibration + args.eval_samples]
+    if not samples:
+        print(f"No labelled images for {part} under {args.data_root}/{part}, int8 export and accuracy are skipped")
+    elif not evaluation:
+        print(f"Too few labelled images for {part} to hold any out, accuracy is skipped")
+    elif n_calibration < args.calibration_samples:
+        print(f"Only {len(samples)} labelled images for {part}: calibrating on {len(calibration)}, "
+              f"evaluating on {len(evaluation)} held-out images")
+
+    img_batch = load_batch([path for path, _ in evaluation]) if evaluation else np.zeros((1, 256, 256, 3), np.uint8)
+    labels = np.array([label for _, label in evaluation])
+
+    keras_fn = tf.function(lambda x: model(app.normalize_batch(x), training=False),
+                           input_signature=app.INPUT_SIGNATURE)
+    keras_scores, accuracy, p50, p99 = measure(keras_fn, img_batch, labels, args.iterations)
+    rows = [(part, "keras float32", accuracy, 1.0, p50, p99, os.path.getsize(keras_path) / 1024)]
+
+    os.makedirs(app.TFLITE_DIR, exist_ok=True)
+    for variant in VARIANTS:
+        if variant == "int8" and not calibration:
+            continue
+        out_path = app.tflite_model_path(part, variant)
+        with open(out_path, "wb") as f:
+            f.write(convert(model, variant, calibration))
+        tflite_model = app.TFLiteModel(out_path, app.TFLITE_NUM_THREADS)
+        scores, accuracy, p50, p99 = measure(tflite_model, img_batch, labels, args.iterations)
+        agreement = float(np.mean((scores > 0.5) == (keras_scores > 0.5)))
+        rows.append((part, f"tflite {variant}", accuracy, agreement, p50, p99, os.path.getsize(out_path) / 1024))
+        print(f"Exported {out_path}")
+    return rows
+
+def format_table(rows):
+    lines = [
+        "| part | backend | accuracy | agreement with keras | p50 ms | p99 ms | size KiB |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for part, backend, accuracy, agreement, p50, p99, size in rows:
+        lines.append(f"| {part} | {backend} | {accuracy:.4f} | {agreement:.4f} | {p50:.2f} | {p99:.2f} | {size:.0f} |")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the part classifiers to float16/int8 TFLite and compare them")
+    parser.add_argument("--data-root", default="data_preparation", help="folder with <part>/<closed|open>/ images")
+    parser.add_argument("--parts", nargs="+", default=list(app.models_info.keys()))
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--eval-samples", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    all_rows = []
+    for part in args.parts:
+        all_rows.extend(export_part(part, args))
+
+    table = format_table(all_rows)
+    print("\n" + table)
+    os.makedirs(app.TFLITE_DIR, exist_ok=True)
+    with open(os.path.join(app.TFLITE_DIR, "comparison.md"), "w") as f:
+        f.write(table + "\n")
@@ -1,20 +1,268 @@
-from flask import Flask, render_template_string, request, send_from_directory
+from flask import Flask, render_template_string, request, send_from_directory, Response, jsonify, url_for
 import cv2
 import os
+import re
+import time
+import base64
+import binascii
+import hashlib
+import mimetypes
+import threading
+import uuid
+import numpy as np
 import torch
-from groundingdino.util.inference import load_model, load_image, predict, annotate
+from io import BytesIO
+from collections import OrderedDict
+from datetime import datetime, timezone
+from PIL import Image, UnidentifiedImageError
+from werkzeug.utils import secure_filename
+import groundingdino.datasets.transforms as T
+from groundingdino.util.inference import load_model, annotate
+from groundingdino.util.utils import get_phrases_from_posmap
 
 config_path = "GroundingDINO_SwinT_OGC.cfg.py"
 weights_path = "groundingdino_swint_ogc.pth"
-model = load_model(config_path, weights_path)
+DEVICE = "cpu"
+model = load_model(config_path, weights_path, device=DEVICE)
+TEXT_FEATURE_CACHE_SIZE = int(os.environ.get("TEXT_FEATURE_CACHE_SIZE", "64"))
+IMAGE_FEATURE_CACHE_SIZE = int(os.environ.get("IMAGE_FEATURE_CACHE_SIZE", "8"))
+IMAGE_FEATURE_CACHE_MAX_MB = int(os.environ.get("IMAGE_FEATURE_CACHE_MAX_MB", "512"))
+
+BOX_THRESHOLD = 0.35
+TEXT_THRESHOLD = 0.35
+
+def normalize_prompt(text):
+    """Lower-case, collapse whitespace and drop leading/trailing '.' separators GroundingDINO uses between phrases"""
+    return " ".join(text.lower().split()).strip(". ")
+
+def parse_prompts(values, box_threshold=BOX_THRESHOLD, text_threshold=TEXT_THRESHOLD):
+    """Prompt dicts (text, box_threshold, text_threshold) from strings, comma- or dot-separated strings or dicts"""
+    prompts = []
+    for value in values:
+        if isinstance(value, dict):
+            text = normalize_prompt(str(value.get("text", "")))
+            if text:
+                prompts.append({
+                    "text": text,
+                    "box_threshold": float(value.get("box_threshold", box_threshold)),
+                    "text_threshold": float(value.get("text_threshold", text_threshold)),
+                })
+            continue
+        for part in re.split(r"[,.\n]", str(value)):
+            text = normalize_prompt(part)
+            if text:
+                prompts.append({"text": text, "box_threshold": box_threshold, "text_threshold": text_threshold})
+    return prompts
+
+def build_caption(prompts):
+    """One dot-separated caption and each prompt's character span in it"""
+    spans = []
+    position = 0
+    for prompt in prompts:
+        spans.append((position, position + len(prompt["text"])))
+        position += len(prompt["text"]) + len(" . ")
+    return " . ".join(prompt["text"] for prompt in prompts) + " .", spans
+
+def predict_prompts(image_tensor, prompts):
+    """Run all prompts through one forward pass and split the detections back out per prompt
+
+    Each prompt's score for a query is its best logit over the prompt's own
+    tokens, so thresholds apply per prompt. Returns (boxes, scores, phrases)
+    per prompt, boxes in normalised cxcywh like predict().
+    """
+    caption, spans = build_caption(prompts)
+    tokenizer = model.tokenizer
+    tokenized = tokenizer(caption, return_offsets_mapping=True)
+    offsets = tokenized.pop("offset_mapping")
+    with torch.no_grad():
+        outputs = model(image_tensor[None].to(DEVICE), captions=[caption])
+    logits = outputs["pred_logits"].cpu().sigmoid()[0]  # queries x text tokens
+    boxes = outputs["pred_boxes"].cpu()[0]
+
+    results = []
+    for prompt, (start, end) in zip(prompts, spans):
+        tokens = [i for i, (token_start, token_end) in enumerate(offsets)
+                  if token_end > token_start and token_start >= start and token_end <= end and i < logits.shape[1]]
+        if not tokens:
+            results.append((boxes[:0], logits[:0, 0], []))
+            continue
+        scores = logits[:, tokens].max(dim=1)[0]
+        mask = scores > prompt["box_threshold"]
+        phrases = []
+        for row in logits[mask]:
+            posmap = torch.zeros_like(row, dtype=torch.bool)
+            posmap[tokens] = row[tokens] > prompt["text_threshold"]
+            phrase = get_phrases_from_posmap(posmap, tokenized, tokenizer).replace(".", "").strip()
+            phrases.append(phrase or prompt["text"])
+        results.append((boxes[mask], scores[mask], phrases))
+    return results
+
+class CachedTextEncoder(torch.nn.Module):
+    """LRU cache in front of the model's BERT text encoder
+
+    GroundingDINO's forward pass calls model.bert(**tokenized) and only reads
+    last_hidden_state, so wrapping that module lets a repeated prompt skip
+    BERT entirely while the image side still runs. Entries are keyed by the
+    token ids (and masks) of the normalised caption.
+    """
+
+    def __init__(self, bert, max_entries=64):
+        super().__init__()
+        self.bert = bert
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(inputs):
+        digest = hashlib.blake2b(digest_size=16)
+        for name in sorted(inputs):
+            value = inputs[name]
+            if torch.is_tensor(value):
+                digest.update(name.encode())
+                digest.update(str(tuple(value.shape)).encode())
+                digest.update(value.detach().cpu().numpy().tobytes())
+        return digest.hexdigest()
+
+    def forward(self, **inputs):
+        key = self.key_for(inputs)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return {"last_hidden_state": cached}
+            self.misses += 1
+        last_hidden_state = self.bert(**inputs)["last_hidden_state"].detach()
+        with self.lock:
+            self.entries[key] = last_hidden_state
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return {"last_hidden_state": last_hidden_state}
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class CachedBackbone(torch.nn.Module):
+    """Bounded cache in front of the model's Swin backbone, keyed by a hash of the image tensor
+
+    A follow-up prompt on the same image then only runs the text encoder and
+    the fusion/decoder stages. The cache is bounded by entry count and bytes
+    since multi-scale features of one 800px image take tens of MB.
+    """
+
+    def __init__(self, backbone, max_entries=8, max_bytes=512 * 1024 * 1024):
+        super().__init__()
+        self.backbone = backbone
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getitem__(self, index):
+        # The forward pass reaches the position embedding as backbone[1]
+        return self.backbone[index]
+
+    @staticmethod
+    def key_for(samples):
+        digest = hashlib.blake2b(digest_size=16)
+        for tensor in (samples.tensors, samples.mask):
+            array = tensor.detach().cpu().contiguous().numpy()
+            digest.update(str(array.shape).encode())
+            digest.update(array)
+        return digest.hexdigest()
+
+    @staticmethod
+    def size_of(features, poss):
+        tensors = [t for feature in features for t in (feature.tensors, feature.mask)] + list(poss)
+        return sum(t.nelement() * t.element_size() for t in tensors)
+
+    def forward(self, samples):
+        key = self.key_for(samples)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if cached is None:
+            with self.lock:
+                self.misses += 1
+            features, poss = self.backbone(samples)
+            cached = (features, poss, self.size_of(features, poss))
+            with self.lock:
+                if key not in self.entries:
+                    self.entries[key] = cached
+                    self.total_bytes += cached[2]
+                while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                    self.total_bytes -= self.entries.popitem(last=False)[1][2]
+        # The forward pass appends extra levels to these lists, so hand out copies
+        return list(cached[0]), list(cached[1])
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+if TEXT_FEATURE_CACHE_SIZE > 0:
+    model.bert = CachedTextEncoder(model.bert, TEXT_FEATURE_CACHE_SIZE)
+if IMAGE_FEATURE_CACHE_SIZE > 0:
+    model.backbone = CachedBackbone(model.backbone, IMAGE_FEATURE_CACHE_SIZE, IMAGE_FEATURE_CACHE_MAX_MB * 1024 * 1024)
 
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "outputs"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+OUTPUT_CACHE_SIZE = int(os.environ.get("OUTPUT_CACHE_SIZE", "32"))
 
 app = Flask(__name__)
 
+# Recently written results kept encoded in memory: filename -> (bytes, etag, last_modified)
+output_cache = OrderedDict()
+output_cache_lock = threading.Lock()
+
+# Same preprocessing as groundingdino.util.inference.load_image, applied to an in-memory image
+transform = T.Compose([
+    T.RandomResize([800], max_size=1333),
+    T.ToTensor(),
+    T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+])
+
+def decode_image(data):
+    """Decode uploaded bytes once into the RGB array used for annotation and the model tensor"""
+    image_pil = Image.open(BytesIO(data)).convert("RGB")
+    image_source = np.asarray(image_pil)
+    image_tensor, _ = transform(image_pil, None)
+    return image_source, image_tensor
+
+def cache_output(filename, data):
+    with output_cache_lock:
+        output_cache[filename] = (data, hashlib.blake2b(data, digest_size=16).hexdigest(), datetime.now(timezone.utc).replace(microsecond=0))
+        output_cache.move_to_end(filename)
+        while len(output_cache) > OUTPUT_CACHE_SIZE:
+            output_cache.popitem(last=False)
+
 HTML = """
 <!DOCTYPE html>
 <html lang="id">
@@ -131,10 +379,18 @@ HTML = """
                                     <i class="fas fa-comments me-2"></i>Prompt Deteksi
                                 </label>
                                 <input type="text" name="prompt" class="form-control form-control-lg" 
-                                       placeholder="Contoh: rear left door, person, car, building..." required>
+                                       placeholder="Contoh: hood, rear left door, rear right door, front left door, front right door" required>
                                 <div class="form-text">
                                     <i class="fas fa-info-circle me-1"></i>
-                                    Masukkan deskripsi objek yang ingin dideteksi dalam bahasa Inggris
+                                    Masukkan deskripsi objek yang ingin dideteksi dalam bahasa Inggris; pisahkan beberapa objek dengan koma
+                                </div>
+                            </div>
+                            <div class="col-12">
+                                <div class="form-check">
+                                    <input class="form-check-input" type="checkbox" name="store" value="1" id="storeInput">
+                                    <label class="form-check-label" for="storeInput">
+                                        Simpan gambar dan hasil deteksi ke disk
+                                    </label>
                                 </div>
                             </div>
                             <div class="col-12 text-center">
@@ -164,6 +420,20 @@ HTML = """
                                         <img src="{{ url_for('output_file', filename=result) }}" 
                                              class="img-fluid w-100" alt="Hasil deteksi">
                                     </div>
+                                    {% if detections %}
+                                    <table class="table table-sm mb-0 text-center">
+                                        <thead><tr><th>Prompt</th><th>Jumlah</th><th>Skor tertinggi</th></tr></thead>
+                                        <tbody>
+                                            {% for d in detections %}
+                                            <tr>
+                                                <td>{{ d.prompt }}</td>
+                                                <td>{{ d.count }}</td>
+                                                <td>{{ "%.2f"|format(d.best) if d.best is not none else "-" }}</td>
+                                            </tr>
+                                            {% endfor %}
+                                        </tbody>
+                                    </table>
+                                    {% endif %}
                                     <div class="card-footer text-center bg-light">
                                         <a href="{{ url_for('output_file', filename=result) }}" 
                                            download class="btn btn-outline-success">
@@ -247,39 +517,171 @@ HTML = """
 </html>
 """
 
+def render_annotated(image_source, results, filename):
+    """Draw every prompt's detections, encode once and cache the result; returns (result_filename, bytes)"""
+    # annotate() returns a BGR frame, ready for cv2 encoding
+    annotated_frame = annotate(
+        image_source=image_source,
+        boxes=torch.cat([boxes for boxes, _, _ in results]),
+        logits=torch.cat([scores for _, scores, _ in results]),
+        phrases=[phrase for _, _, phrases in results for phrase in phrases]
+    )
+    stem, ext = os.path.splitext(filename)
+    if ext.lower() not in (".jpg", ".jpeg", ".png", ".bmp", ".webp"):
+        ext = ".jpg"
+    result_filename = f"result_{uuid.uuid4().hex[:8]}_{stem}{ext}"
+    success, encoded = cv2.imencode(ext, annotated_frame)
+    if not success:
+        raise ValueError(f"Could not encode result as {ext}")
+    cache_output(result_filename, encoded.tobytes())
+    return result_filename, encoded.tobytes()
+
+def store_result(filename, data, result_filename, encoded):
+    with open(os.path.join(UPLOAD_FOLDER, filename), "wb") as f:
+        f.write(data)
+    with open(os.path.join(OUTPUT_FOLDER, result_filename), "wb") as f:
+        f.write(encoded)
+
+def format_detections(prompts, results, width, height):
+    """Per-prompt detections with boxes as normalised cxcywh, normalised xyxy and pixel xyxy"""
+    formatted = []
+    for prompt, (boxes, scores, phrases) in zip(prompts, results):
+        detections = []
+        for (cx, cy, w, h), score, phrase in zip(boxes.tolist(), scores.tolist(), phrases):
+            xyxy = [max(0.0, cx - w / 2), max(0.0, cy - h / 2), min(1.0, cx + w / 2), min(1.0, cy + h / 2)]
+            detections.append({
+                "phrase": phrase,
+                "score": round(score, 4),
+                "box_cxcywh": [round(v, 4) for v in (cx, cy, w, h)],
+                "box_normalized": [round(v, 4) for v in xyxy],
+                "box_pixels": [round(xyxy[0] * width, 1), round(xyxy[1] * height, 1),
+                               round(xyxy[2] * width, 1), round(xyxy[3] * height, 1)],
+            })
+        formatted.append({
+            "prompt": prompt["text"],
+            "box_threshold": prompt["box_threshold"],
+            "text_threshold": prompt["text_threshold"],
+            "detections": detections,
+        })
+    return formatted
+
+def read_api_request():
+    """Image bytes, prompt values, thresholds and flags from multipart, JSON (base64 image) or a raw image body"""
+    if request.files:
+        file = request.files.get("image") or next(iter(request.files.values()))
+        data, filename = file.read(), file.filename
+        values = request.form
+        prompts = values.getlist("prompt") + values.getlist("prompts")
+    elif request.is_json:
+        values = request.get_json(silent=True) or {}
+        image = values.get("image") or ""
+        data = base64.b64decode(image.split(",", 1)[1] if image.startswith("data:") else image)
+        filename = values.get("filename") or "upload.jpg"
+        prompts = values.get("prompts") or [values.get("prompt") or ""]
+        if isinstance(prompts, str):
+            prompts = [prompts]
+    else:
+        data, filename = request.get_data(), "upload.jpg"
+        values = request.args
+        prompts = values.getlist("prompt") + values.getlist("prompts")
+    if not data:
+        raise ValueError("No image provided")
+
+    def flag(name):
+        value = values.get(name, request.args.get(name))
+        return value in (True, 1, "1", "true", "yes")
+
+    options = {
+        "box_threshold": float(values.get("box_threshold", request.args.get("box_threshold", BOX_THRESHOLD))),
+        "text_threshold": float(values.get("text_threshold", request.args.get("text_threshold", TEXT_THRESHOLD))),
+        "annotate": flag("annotate"),
+        "store": flag("store"),
+    }
+    return data, secure_filename(filename) or "upload.jpg", prompts, options
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     result_filename = None
+    detections = None
     if request.method == "POST":
         file = request.files["image"]
-        prompt = request.form["prompt"]
-        img_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(img_path)
-        cv2_bgr = cv2.imread(img_path)
-        cv2_rgb = cv2.cvtColor(cv2_bgr, cv2.COLOR_BGR2RGB)
-        image_source, image_tensor = load_image(img_path)
-        boxes, logits, phrases = predict(
-            model=model,
-            image=image_tensor,
-            caption=prompt,
-            box_threshold=0.35,
-            text_threshold=0.35,
-            device="cpu"
-        )
-        annotated_frame = annotate(
-            image_source=cv2_rgb,
-            boxes=boxes,
-            logits=logits,
-            phrases=phrases
-        )
-        result_filename = f"result_{file.filename}"
-        out_path = os.path.join(OUTPUT_FOLDER, result_filename)
-        cv2.imwrite(out_path, cv2.cvtColor(annotated_frame, cv2.COLOR_RGB2BGR))
-    return render_template_string(HTML, result=result_filename)
+        prompts = parse_prompts(request.form.getlist("prompt"))
+        if not prompts:
+            return "Prompt is required", 400
+        store = request.form.get("store") == "1"
+        data = file.read()
+        image_source, image_tensor = decode_image(data)
+        results = predict_prompts(image_tensor, prompts)
+        detections = [{"prompt": prompt["text"], "count": len(phrases),
+                       "best": float(scores.max()) if len(phrases) else None}
+                      for prompt, (boxes, scores, phrases) in zip(prompts, results)]
+        filename = secure_filename(file.filename) or "upload.jpg"
+        result_filename, encoded = render_annotated(image_source, results, filename)
+        if store:
+            store_result(filename, data, result_filename, encoded)
+    return render_template_string(HTML, result=result_filename, detections=detections)
+
+@app.route("/api/ground", methods=["POST"])
+def ground_api():
+    """JSON grounding for machine clients; the annotated image is only rendered with annotate=1"""
+    try:
+        try:
+            data, filename, prompt_values, options = read_api_request()
+            prompts = parse_prompts(prompt_values, options["box_threshold"], options["text_threshold"])
+            if not prompts:
+                raise ValueError("At least one prompt is required")
+            image_source, image_tensor = decode_image(data)
+        except (ValueError, binascii.Error, UnidentifiedImageError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        start = time.perf_counter()
+        results = predict_prompts(image_tensor, prompts)
+        inference_ms = (time.perf_counter() - start) * 1000
+        height, width = image_source.shape[:2]
+        response = {
+            "width": width,
+            "height": height,
+            "caption": build_caption(prompts)[0],
+            "inference_ms": round(inference_ms, 1),
+            "results": format_detections(prompts, results, width, height),
+            "annotated_url": None,
+        }
+        if options["annotate"] or options["store"]:
+            result_filename, encoded = render_annotated(image_source, results, filename)
+            response["annotated_url"] = url_for("output_file", filename=result_filename)
+            if options["store"]:
+                store_result(filename, data, result_filename, encoded)
+        return jsonify(response)
+
+    except Exception as e:
+        app.logger.error(f"Grounding API error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/outputs/<filename>")
 def output_file(filename):
-    return send_from_directory(OUTPUT_FOLDER, filename)
+    with output_cache_lock:
+        cached = output_cache.get(filename)
+        if cached is not None:
+            output_cache.move_to_end(filename)
+    if cached is None:
+        # Evicted results are only on disk if they were stored; send_from_directory also answers 304s
+        return send_from_directory(OUTPUT_FOLDER, filename)
+    data, etag, last_modified = cached
+    response = Response(data, mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route("/status")
+def status():
+    text_cache = model.bert.stats() if isinstance(model.bert, CachedTextEncoder) else None
+    image_cache = model.backbone.stats() if isinstance(model.backbone, CachedBackbone) else None
+    return jsonify({
+        "text_feature_cache": text_cache,
+        "image_feature_cache": image_cache,
+        "output_cache": {"entries": len(output_cache), "max_entries": OUTPUT_CACHE_SIZE},
+    })
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,101 @@
+import os
+import gc
+import argparse
+import logging
+
+os.environ["APP_AUTOSTART"] = "0"
+
+logger = logging.getLogger("serve")
+
+def parse_args():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Pre-fork production server for the car detection API")
+    parser.add_argument("--bind", default=os.environ.get("SERVE_BIND", "0.0.0.0:5000"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVE_WORKERS", "0")),
+                        help="worker processes (default: CPU cores / intra-op threads)")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("SERVE_THREADS", "4")),
+                        help="request threads per worker, lets the micro-batcher group concurrent frames")
+    parser.add_argument("--intra-op-threads", type=int, default=int(os.environ.get("TF_INTRA_OP_THREADS", "1")),
+                        help="TensorFlow/TFLite compute threads per worker")
+    parser.add_argument("--inter-op-threads", type=int, default=int(os.environ.get("TF_INTER_OP_THREADS", "1")))
+    parser.add_argument("--timeout", type=int, default=120)
+    args = parser.parse_args()
+    if args.workers <= 0:
+        args.workers = max(1, cpu_count // max(1, args.intra_op_threads))
+    return args
+
+def configure_tf_threads(intra_op_threads, inter_op_threads):
+    """Pin TF thread pools; only effective before the runtime executes its first op"""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+def preload_in_master(app_module):
+    """Whether the models can be loaded once in the master and shared with the workers
+
+    The TensorFlow runtime is not fork-safe (its thread pools do not survive
+    fork), so only the TFLite backend, whose inference path is NumPy plus the
+    interpreter, can be preloaded. Keras models are loaded by each worker.
+    """
+    variant = app_module.TFLITE_BACKENDS.get(app_module.MODEL_BACKEND)
+    if variant is None:
+        return False
+    missing = [part for part in app_module.models_info
+               if not os.path.exists(app_module.tflite_model_path(part, variant))]
+    if missing:
+        logger.warning(f"TFLite models missing for {missing}, workers will load models themselves")
+        return False
+    return True
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("TFLITE_NUM_THREADS", str(args.intra_op_threads))
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("gunicorn is required for the production server: pip install gunicorn")
+
+    import app as app_module
+
+    shared = preload_in_master(app_module)
+    if shared:
+        app_module.load_models()
+        # Move everything allocated so far out of the GC's reach so the
+        # collector does not dirty (and un-share) the preloaded pages in workers
+        gc.freeze()
+        logger.info("Models preloaded in master, shared copy-on-write with workers")
+
+    def post_fork(server, worker):
+        if not shared:
+            configure_tf_threads(args.intra_op_threads, args.inter_op_threads)
+        app_module.start_service(background_loading=not shared)
+        server.log.info(f"Worker {worker.pid} started ({'shared' if shared else 'own'} models)")
+
+    class PreforkServer(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app_module.app
+
+    logger.info(f"Serving on {args.bind} with {args.workers} workers x {args.threads} threads, "
+                f"{args.intra_op_threads} intra-op thread(s) each")
+    PreforkServer({
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": "gthread",
+        "timeout": args.timeout,
+        "preload_app": True,
+        "post_fork": post_fork,
+    }).run()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+
+# Only the models are needed here: no background loading, batching or screenshot threads
+os.environ["APP_AUTOSTART"] = "0"
+import app
+
+END_OF_VIDEO = object()
+
+def decode_frames(video_path, stride, frame_queue, stop_event, max_frames=None):
+    """Decoder thread: push (index, timestamp_ms, uint8 256x256 batch) for every stride-th frame"""
+    vidcap = cv2.VideoCapture(video_path)
+    try:
+        if not vidcap.isOpened():
+            raise IOError(f"Cannot open video {video_path}")
+        fps = vidcap.get(cv2.CAP_PROP_FPS) or 0.0
+        index = 0
+        emitted = 0
+        while not stop_event.is_set():
+            # grab() only demuxes; frames skipped by the stride are never decoded
+            if not vidcap.grab():
+                break
+            if index % stride == 0:
+                success, frame = vidcap.retrieve()
+                if not success:
+                    break
+                timestamp_ms = vidcap.get(cv2.CAP_PROP_POS_MSEC)
+                if not timestamp_ms and fps:
+                    timestamp_ms = index * 1000.0 / fps
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frame_queue.put((index, timestamp_ms, app.preprocess_image(Image.fromarray(rgb))))
+                emitted += 1
+                if max_frames is not None and emitted >= max_frames:
+                    break
+            index += 1
+        frame_queue.put(END_OF_VIDEO)
+    except Exception as e:
+        frame_queue.put(e)
+    finally:
+        vidcap.release()
+
+def write_batch(out, batch):
+    img_batch = np.concatenate([item[2] for item in batch], axis=0)
+    for (index, timestamp_ms, _), predictions in zip(batch, app.predict_batch(img_batch)):
+        out.write(json.dumps({"frame": index, "timestamp_ms": round(timestamp_ms, 1), "predictions": predictions}) + "\n")
+
+def process_video(video_path, output_path, stride=1, batch_size=32, prefetch_batches=4, max_frames=None):
+    """Stream a video through the part classifiers, writing one JSONL line per processed frame"""
+    frame_queue = queue.Queue(maxsize=batch_size * prefetch_batches)
+    stop_event = threading.Event()
+    decoder = threading.Thread(target=decode_frames, name="video-decoder", daemon=True,
+                               args=(video_path, stride, frame_queue, stop_event, max_frames))
+    decoder.start()
+
+    processed = 0
+    start = time.perf_counter()
+    out = sys.stdout if output_path == "-" else open(output_path, "w")
+    try:
+        batch = []
+        while True:
+            item = frame_queue.get()
+            if item is END_OF_VIDEO:
+                break
+            if isinstance(item, Exception):
+                raise item
+            batch.append(item)
+            if len(batch) == batch_size:
+                write_batch(out, batch)
+                processed += len(batch)
+                batch = []
+                elapsed = time.perf_counter() - start
+                print(f"{processed} frames, {processed / elapsed:.1f} frames/s", file=sys.stderr)
+        if batch:
+            write_batch(out, batch)
+            processed += len(batch)
+    finally:
+        stop_event.set()
+        # Unblock the decoder if it is waiting on a full queue
+        while decoder.is_alive():
+            try:
+                frame_queue.get_nowait()
+            except queue.Empty:
+                decoder.join(timeout=0.1)
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {processed} frames from {video_path} in {elapsed:.1f}s "
+          f"({processed / elapsed if elapsed else 0:.1f} frames/s)", file=sys.stderr)
+    return processed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the five part classifiers over a recorded video")
+    parser.add_argument("video", help="path to an mp4 (or any format OpenCV can read)")
+    parser.add_argument("--output", default="-", help="JSONL output file, '-' for stdout")
+    parser.add_argument("--stride", type=int, default=1, help="process every N-th frame")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--prefetch-batches", type=int, default=4, help="decoded batches buffered ahead of inference")
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args()
+
+    app.load_models()
+    process_video(args.video, args.output, max(1, args.stride), max(1, args.batch_size),
+                  max(1, args.prefetch_batches), args.max_frames)